@@ -0,0 +1,84 @@
+"""
+Benchmark: the cost of the get_SIZE_*() accessor methods when loading photos.
+
+Photologue used to add four methods per photo size to every model instance
+from a post_init signal; they are now looked up on demand by
+ImageModel.__getattr__. This loads a queryset of photos both ways.
+
+Run it from the top folder of the repository:
+
+    python benchmarks/accessors.py [number of photos] [number of sizes]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import django
+from django.conf import settings
+
+settings.configure(
+    DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+    INSTALLED_APPS=['django.contrib.contenttypes',
+                    'django.contrib.auth',
+                    'django.contrib.sites',
+                    'sortedm2m',
+                    'photologue'],
+    SITE_ID=1,
+)
+if hasattr(django, 'setup'):
+    django.setup()
+
+from django.core.management import call_command
+from django.db.models.signals import post_init
+from django.utils.functional import curry
+
+from photologue.models import Photo, PhotoSize, PhotoSizeCache
+
+PHOTOS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+SIZES = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+REPEAT = 5
+
+
+def add_accessor_methods(sender, instance, **kwargs):
+    """How the accessors used to be set up."""
+    if hasattr(instance, '_get_SIZE_url'):
+        for size in PhotoSizeCache().sizes.keys():
+            setattr(instance, 'get_%s_size' % size, curry(instance._get_SIZE_size, size=size))
+            setattr(instance, 'get_%s_photosize' % size, curry(instance._get_SIZE_photosize, size=size))
+            setattr(instance, 'get_%s_url' % size, curry(instance._get_SIZE_url, size=size))
+            setattr(instance, 'get_%s_filename' % size, curry(instance._get_SIZE_filename, size=size))
+
+
+def load():
+    list(Photo.objects.all())
+
+
+def load_and_access():
+    for photo in Photo.objects.all():
+        photo.get_size0_photosize()
+
+
+def run(label):
+    for func in (load, load_and_access):
+        best = min(timeit.repeat(func, number=1, repeat=REPEAT))
+        print('{0:<28} {1:<16} {2:8.1f} ms'.format(label, func.__name__, best * 1000))
+
+
+if __name__ == '__main__':
+    call_command('migrate' if django.VERSION >= (1, 7) else 'syncdb', interactive=False, verbosity=0)
+    PhotoSize.objects.all().delete()
+    PhotoSize.objects.bulk_create([PhotoSize(name='size{0}'.format(i), width=100 + i) for i in range(SIZES)])
+    Photo.objects.bulk_create([Photo(title='photo {0}'.format(i),
+                                     slug='photo-{0}'.format(i),
+                                     image='photologue/photos/photo{0}.jpg'.format(i))
+                               for i in range(PHOTOS)])
+    PhotoSizeCache().reset()
+    PhotoSizeCache()
+
+    print('{0} photos, {1} photo sizes, best of {2}'.format(PHOTOS, SIZES, REPEAT))
+    run('class-level __getattr__')
+    post_init.connect(add_accessor_methods)
+    run('per-instance (post_init)')
+    post_init.disconnect(add_accessor_methods)
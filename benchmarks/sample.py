@@ -0,0 +1,84 @@
+"""
+Benchmark: Gallery.sample() on large galleries.
+
+sample() used to count the photos in the gallery twice, then load every one of
+them to pick a few at random. It now picks from a cached list of the ids of the
+photos in the gallery, and only loads the photos it picked.
+
+Run it from the top folder of the repository:
+
+    python benchmarks/sample.py [number of photos]
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import django
+from django.conf import settings
+
+settings.configure(
+    DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+    INSTALLED_APPS=['django.contrib.contenttypes',
+                    'django.contrib.auth',
+                    'django.contrib.sites',
+                    'sortedm2m',
+                    'photologue'],
+    SITE_ID=1,
+)
+if hasattr(django, 'setup'):
+    django.setup()
+
+from django.contrib.sites.models import Site
+from django.core.management import call_command
+
+from photologue.models import Gallery, Photo, SAMPLE_SIZE
+
+PHOTOS = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+REPEAT = 5
+
+
+def sample_before(gallery, count=None, public=True):
+    """How the sample used to be taken."""
+    if not count:
+        count = SAMPLE_SIZE
+    if count > gallery.photo_count():
+        count = gallery.photo_count()
+    if public:
+        photo_set = gallery.public()
+    else:
+        photo_set = gallery.photos.filter(sites__id=settings.SITE_ID)
+    return random.sample(set(photo_set), count)
+
+
+def run(label, func):
+    best = min(timeit.repeat(func, number=1, repeat=REPEAT))
+    print('{0:<28} {1:10.2f} ms'.format(label, best * 1000))
+
+
+if __name__ == '__main__':
+    call_command('migrate' if django.VERSION >= (1, 7) else 'syncdb', interactive=False, verbosity=0)
+    site = Site.objects.get_current()
+    gallery = Gallery.objects.create(title='Benchmark', slug='benchmark')
+    Photo.objects.bulk_create([Photo(title='photo {0}'.format(i),
+                                     slug='photo-{0}'.format(i),
+                                     image='photologue/photos/photo{0}.jpg'.format(i))
+                               for i in range(PHOTOS)])
+    photos = list(Photo.objects.order_by('pk'))
+    field = Photo._meta.get_field('sites')
+    field.rel.through.objects.bulk_create([
+        field.rel.through(**{field.m2m_field_name(): photo, field.m2m_reverse_field_name(): site})
+        for photo in photos])
+    field = Gallery._meta.get_field('photos')
+    through = field.rel.through
+    sort_field_name = getattr(through, '_sort_field_name', 'sort_value')
+    through.objects.bulk_create([
+        through(**{field.m2m_field_name(): gallery, field.m2m_reverse_field_name(): photo, sort_field_name: i})
+        for i, photo in enumerate(photos)])
+
+    print('{0} photos in the gallery, best of {1}'.format(PHOTOS, REPEAT))
+    run('before', lambda: sample_before(gallery))
+    gallery.sample()
+    run('after', lambda: gallery.sample())
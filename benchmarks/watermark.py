@@ -0,0 +1,70 @@
+"""
+Benchmark: applying a watermark to large images.
+
+A watermark used to be laid out mark by mark in a full size layer for every
+image, which was then blended with the whole image converted to RGBA. The
+layout is now done a row at a time and cached for each image size, only the
+part of the image that the watermark covers is blended, and RGB images stay
+in RGB. This applies both versions to a 24 megapixel image, for each style.
+
+Run it from the top folder of the repository:
+
+    python benchmarks/watermark.py [number of repeats]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from photologue.utils.watermark import Image, reduce_opacity, watermark_region, composite_region
+
+REPEAT = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+SIZE = (6000, 4000)
+STYLES = ['tile', 'scale', (100, 100)]
+SAMPLE_IMAGE_PATH = os.path.join(os.path.dirname(__file__), '..', 'photologue', 'res', 'sample.jpg')
+
+
+def apply_watermark_before(im, mark, position, opacity=1):
+    """How the watermark used to be applied."""
+    if opacity < 1:
+        mark = reduce_opacity(mark, opacity)
+    if im.mode != 'RGBA':
+        im = im.convert('RGBA')
+    layer = Image.new('RGBA', im.size, (0, 0, 0, 0))
+    if position == 'tile':
+        for y in range(0, im.size[1], mark.size[1]):
+            for x in range(0, im.size[0], mark.size[0]):
+                layer.paste(mark, (x, y))
+    elif position == 'scale':
+        ratio = min(
+            float(im.size[0]) / mark.size[0], float(im.size[1]) / mark.size[1])
+        w = int(mark.size[0] * ratio)
+        h = int(mark.size[1] * ratio)
+        mark = mark.resize((w, h))
+        layer.paste(mark, ((im.size[0] - w) // 2, (im.size[1] - h) // 2))
+    else:
+        layer.paste(mark, position)
+    return Image.composite(layer, im, layer)
+
+
+def best(func):
+    return min(timeit.repeat(func, number=1, repeat=REPEAT)) * 1000
+
+
+if __name__ == '__main__':
+    sample = Image.open(SAMPLE_IMAGE_PATH).convert('RGB')
+    im = sample.resize(SIZE)
+    mark = reduce_opacity(sample.resize((120, 80)), 0.5)
+    print('{0}x{1} image, best of {2}'.format(SIZE[0], SIZE[1], REPEAT))
+    print('{0:<12} {1:>10} {2:>12} {3:>12}'.format('style', 'before', 'after', 'after, cached'))
+    for style in STYLES:
+        region = watermark_region(mark, im.size, style)
+        before = apply_watermark_before(im, mark, style)
+        after = composite_region(im, *region)
+        assert before.convert('RGB').tobytes() == after.tobytes(), 'The output has changed.'
+        print('{0:<12} {1:>8.0f} ms {2:>9.0f} ms {3:>9.0f} ms'.format(
+            str(style),
+            best(lambda: apply_watermark_before(im, mark, style)),
+            best(lambda: composite_region(im, *watermark_region(mark, im.size, style))),
+            best(lambda: composite_region(im, *region))))
@@ -6,7 +6,7 @@ from django.contrib import messages
 from django.utils.translation import ungettext, ugettext_lazy as _
 
 from .models import Gallery, Photo, GalleryUpload, PhotoEffect, PhotoSize, \
-    Watermark
+    Watermark, UploadSession, RenditionJob
 
 MULTISITE = getattr(settings, 'PHOTOLOGUE_MULTISITE', False)
 
@@ -144,6 +144,16 @@ class GalleryUploadAdmin(admin.ModelAdmin):
 admin.site.register(GalleryUpload, GalleryUploadAdmin)
 
 
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ('title', 'gallery', 'created', 'size', 'received', 'photo_count', 'completed')
+    readonly_fields = ('gallery', 'title', 'caption', 'is_public', 'tags', 'size', 'created')
+
+    def has_add_permission(self, request):
+        return False  # Uploads are started through the upload views.
+
+admin.site.register(UploadSession, UploadSessionAdmin)
+
+
 class PhotoAdminForm(forms.ModelForm):
 
     class Meta:
@@ -250,3 +260,14 @@ class WatermarkAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Watermark, WatermarkAdmin)
+
+
+class RenditionJobAdmin(admin.ModelAdmin):
+    list_display = ('size_name', 'effect', 'content_type', 'remove', 'progress', 'created', 'claimed')
+    readonly_fields = ('content_type', 'size_name', 'effect', 'without_effect', 'remove', 'position', 'processed',
+                       'total', 'created', 'claimed')
+
+    def has_add_permission(self, request):
+        return False  # Jobs are created when photo sizes and effects change.
+
+admin.site.register(RenditionJob, RenditionJobAdmin)
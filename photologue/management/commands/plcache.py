@@ -1,12 +1,30 @@
 from __future__ import print_function
+import os
+import json
+import time
+from multiprocessing import Pool
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 from optparse import make_option
-from photologue.models import PhotoSize, ImageModel
+from photologue.models import PhotoSize, PhotoSizeCache, ImageModel
+
+try:
+    from django.apps import apps
+    get_model = apps.get_model
+except ImportError:
+    # Django 1.6.
+    from django.db.models import get_model
 
 
 class Command(BaseCommand):
     option_list = BaseCommand.option_list + (
         make_option('--reset', '-r', action='store_true', dest='reset', help='Reset photo cache before generating'),
+        make_option('--workers', '-w', type='int', dest='workers', default=1,
+                    help='Number of processes to cache photos with (default: 1)'),
+        make_option('--chunk-size', type='int', dest='chunk_size', default=500,
+                    help='Size of the ranges of primary keys handed to a process at a time (default: 500)'),
+        make_option('--checkpoint', dest='checkpoint',
+                    help='File to record progress in; an interrupted run resumes from it'),
     )
 
     help = ('Manages Photologue cache file for the given sizes.')
@@ -24,6 +42,9 @@ def create_cache(sizes, options):
     Creates the cache for the given files
     """
     reset = options.get('reset', None)
+    workers = options.get('workers') or 1
+    chunk_size = options.get('chunk_size') or 500
+    checkpoint = options.get('checkpoint', None)
 
     size_list = [size.strip(' ,') for size in sizes]
 
@@ -35,12 +56,109 @@ def create_cache(sizes, options):
     if not len(sizes):
         raise CommandError('No photo sizes were found.')
 
-    print('Caching photos, this may take a while...')
+    size_names = sorted([photosize.name for photosize in sizes])
+    done = load_checkpoint(checkpoint, size_names, reset, chunk_size)
 
+    # Chunks are fixed ranges of primary keys, so that a chunk recorded in the
+    # checkpoint still covers the same photos after some are added or deleted.
+    chunks = []
+    total = 0
     for cls in ImageModel.__subclasses__():
-        for photosize in sizes:
-            print('Cacheing %s size images' % photosize.name)
-            for obj in cls.objects.all():
-                if reset:
-                    obj.remove_size(photosize)
-                obj.create_size(photosize)
+        label = '%s.%s' % (cls._meta.app_label, cls._meta.object_name)
+        counts = {}
+        for pk in cls.objects.values_list('pk', flat=True).iterator():
+            counts[pk // chunk_size] = counts.get(pk // chunk_size, 0) + 1
+        for index in sorted(counts):
+            chunk = (label, index * chunk_size, (index + 1) * chunk_size - 1)
+            if chunk_key(chunk) not in done:
+                chunks.append(chunk)
+                total += counts[index]
+
+    if done:
+        print('Resuming from %s, %d chunks already done.' % (checkpoint, len(done)))
+    print('Caching %d photos in %s sizes, this may take a while...' % (total, ', '.join(size_names)))
+
+    jobs = [(chunk, size_names, reset) for chunk in chunks]
+    if workers > 1:
+        # Child processes must open their own database connections.
+        for connection in connections.all():
+            connection.close()
+        pool = Pool(workers)
+        results = pool.imap_unordered(cache_chunk, jobs)
+    else:
+        pool = None
+        results = (cache_chunk(job) for job in jobs)
+
+    started = time.time()
+    processed = 0
+    try:
+        for chunk, count in results:
+            processed += count
+            done.add(chunk_key(chunk))
+            save_checkpoint(checkpoint, size_names, reset, chunk_size, done)
+            elapsed = max(time.time() - started, 0.001)
+            rate = processed / elapsed
+            remaining = (total - processed) / rate if rate else 0
+            print('%d/%d photos, %.1f photos/sec, ETA %s' % (
+                processed, total, rate, format_duration(remaining)))
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    if checkpoint and os.path.exists(checkpoint):
+        # The run is complete, so the next one should start from scratch.
+        os.remove(checkpoint)
+
+
+def cache_chunk(job):
+    """Cache one range of primary keys; runs in a worker process."""
+    chunk, size_names, reset = job
+    label, first_pk, last_pk = chunk
+    model = get_model(*label.split('.'))
+    cache = PhotoSizeCache()
+    photosizes = [cache.sizes[name] for name in size_names if name in cache.sizes]
+    count = 0
+    for obj in model.objects.filter(pk__gte=first_pk, pk__lte=last_pk).order_by('pk'):
+        if reset:
+            for photosize in photosizes:
+                obj.remove_size(photosize)
+        obj.create_sizes(photosizes)
+        count += 1
+    return chunk, count
+
+
+def chunk_key(chunk):
+    return '%s:%s-%s' % chunk
+
+
+def load_checkpoint(checkpoint, size_names, reset, chunk_size):
+    if not checkpoint or not os.path.exists(checkpoint):
+        return set()
+    with open(checkpoint) as f:
+        data = json.load(f)
+    if data.get('sizes') != size_names or data.get('reset') != bool(reset) or \
+            data.get('chunk_size') != chunk_size:
+        raise CommandError('The checkpoint %s was created for different sizes or options; '
+                           'delete it to start again.' % checkpoint)
+    return set(data.get('done', []))
+
+
+def save_checkpoint(checkpoint, size_names, reset, chunk_size, done):
+    if not checkpoint:
+        return
+    # Write to a temporary file first, so that an interruption cannot leave a
+    # truncated checkpoint behind.
+    tmp = checkpoint + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'sizes': size_names, 'reset': bool(reset), 'chunk_size': chunk_size,
+                   'done': sorted(done)}, f)
+    if os.name == 'nt' and os.path.exists(checkpoint):
+        # Windows will not rename over an existing file.
+        os.remove(checkpoint)
+    os.rename(tmp, checkpoint)
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return '%d:%02d:%02d' % (hours, minutes, seconds)
@@ -0,0 +1,29 @@
+from __future__ import print_function
+from django.core.management.base import BaseCommand
+from photologue.models import Gallery, update_gallery_photo_counts
+
+
+class Command(BaseCommand):
+    help = ('Recounts the photos in the given galleries (all of them by default).')
+    args = '[slugs]'
+
+    requires_model_validation = True
+    can_import_settings = True
+
+    def handle(self, *args, **options):
+        return count_photos(args, options)
+
+
+def count_photos(slugs, options):
+    """
+    Recounts the photos in the given galleries.
+    """
+    slug_list = [slug.strip(' ,') for slug in slugs]
+
+    if slug_list:
+        galleries = list(Gallery.objects.filter(slug__in=slug_list).values_list('pk', flat=True))
+        print('Counting the photos in %d galleries...' % len(galleries))
+        update_gallery_photo_counts(galleries)
+    else:
+        print('Counting the photos in all galleries...')
+        update_gallery_photo_counts()
@@ -0,0 +1,20 @@
+from __future__ import print_function
+from django.core.management.base import BaseCommand
+from photologue.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = ('Deletes the chunked uploads that were never completed, with their chunks.')
+
+    requires_model_validation = True
+    can_import_settings = True
+
+    def handle(self, *args, **options):
+        return expire_uploads(options)
+
+
+def expire_uploads(options):
+    """
+    Deletes the uploads older than PHOTOLOGUE_UPLOAD_SESSION_EXPIRY that were never completed.
+    """
+    print('Deleted %d expired uploads.' % UploadSession.delete_expired())
@@ -0,0 +1,50 @@
+from __future__ import print_function
+import os
+from optparse import make_option
+from django.core.management.base import BaseCommand
+from photologue.models import ImageModel
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('--orphans', action='store_true', dest='orphans',
+                    help='Also delete the files in the cache directories that no photo refers to'),
+    )
+
+    help = ('Deletes stale cached sizes, and cached sizes of photo sizes that no longer exist.')
+
+    requires_model_validation = True
+    can_import_settings = True
+
+    def handle(self, *args, **options):
+        return sweep_cache(options)
+
+
+def sweep_cache(options):
+    """
+    Deletes the cached sizes that are no longer up to date.
+    """
+    orphans = options.get('orphans', None)
+    removed = 0
+    # (storage, cache directory) -> names of the files that are in use.
+    in_use = {}
+
+    for cls in ImageModel.__subclasses__():
+        print('Sweeping %s cached sizes' % cls._meta.verbose_name)
+        for obj in cls.objects.all().iterator():
+            removed += obj.sweep_cache()
+            if orphans:
+                names = in_use.setdefault((obj.image.storage, obj.cache_path()), set())
+                for entry in obj._get_manifest().values():
+                    if entry.get('path'):
+                        names.add(os.path.basename(entry['path']))
+
+    for (storage, directory), names in in_use.items():
+        if not storage.exists(directory):
+            continue
+        for name in storage.listdir(directory)[1]:
+            if name not in names:
+                storage.delete(os.path.join(directory, name))
+                removed += 1
+
+    print('Deleted %d cached sizes.' % removed)
@@ -0,0 +1,47 @@
+from __future__ import print_function
+import time
+from django.core.management.base import BaseCommand
+from optparse import make_option
+from photologue.queues import process_queue, process_rendition_jobs
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('--once', action='store_true', dest='once',
+                    help='Exit as soon as the queue is empty'),
+        make_option('--sleep', type='float', dest='sleep', default=5,
+                    help='Seconds to wait when the queue is empty (default: 5)'),
+        make_option('--batch', type='int', dest='batch', default=100,
+                    help='Number of sizes to claim at a time (default: 100)'),
+    )
+
+    help = ('Creates the photo sizes queued by photologue.queues.DatabaseQueue, and runs the '
+            'rendition jobs of changed photo sizes.')
+
+    requires_model_validation = True
+    can_import_settings = True
+
+    def handle(self, *args, **options):
+        return run_worker(options)
+
+
+def run_worker(options):
+    """
+    Processes the queue until it is empty, or forever
+    """
+    once = options.get('once', False)
+    sleep = options.get('sleep', 5)
+    batch = options.get('batch', 100)
+
+    while True:
+        processed = process_queue(batch_size=batch)
+        if processed:
+            print('Created %d sizes' % processed)
+        updated = process_rendition_jobs(batch_size=batch)
+        if updated:
+            print('Updated the cached sizes of %d photos' % updated)
+        if processed or updated:
+            continue
+        if once:
+            break
+        time.sleep(sleep)
@@ -16,8 +16,61 @@ class SharedQueries(object):
 
 
 class GalleryQuerySet(SharedQueries, QuerySet):
-    pass
+
+    _sample_options = None
+
+    def with_samples(self, count=None, size=None):
+        """Pick a random sample of photos for each gallery as the galleries are
+        loaded, with the same few queries however many galleries there are;
+        sample() then returns it.
+
+        If the name of a photo size is given, the urls of that size are worked
+        out for the photos as well, as with PhotoQuerySet.with_rendition_urls().
+        """
+        return self._clone(_sample_options=(count, size))
+
+    def _clone(self, *args, **kwargs):
+        kwargs.setdefault('_sample_options', self._sample_options)
+        return super(GalleryQuerySet, self)._clone(*args, **kwargs)
+
+    def iterator(self):
+        if self._sample_options is None:
+            for gallery in super(GalleryQuerySet, self).iterator():
+                yield gallery
+            return
+        from .models import set_gallery_samples
+        galleries = list(super(GalleryQuerySet, self).iterator())
+        set_gallery_samples(galleries, *self._sample_options)
+        for gallery in galleries:
+            yield gallery
 
 
 class PhotoQuerySet(SharedQueries, QuerySet):
-    pass
+
+    _rendition_sizes = ()
+
+    def with_rendition_urls(self, *sizes):
+        """Work out the urls of the named photo sizes for each photo as it is
+        loaded, so that e.g. get_thumbnail_url() returns straight away.
+
+        Unlike get_SIZE_url(), this does not increment view counts.
+        """
+        return self._clone(_rendition_sizes=sizes)
+
+    def _clone(self, *args, **kwargs):
+        kwargs.setdefault('_rendition_sizes', self._rendition_sizes)
+        return super(PhotoQuerySet, self)._clone(*args, **kwargs)
+
+    def iterator(self):
+        photosizes = None
+        if self._rendition_sizes:
+            from .models import PhotoSizeCache
+            sizes = PhotoSizeCache().sizes
+            for name in self._rendition_sizes:
+                if name not in sizes:
+                    raise ValueError('Unknown photo size "{0}".'.format(name))
+            photosizes = [sizes[name] for name in self._rendition_sizes]
+        for photo in super(PhotoQuerySet, self).iterator():
+            if photosizes:
+                photo.set_rendition_urls(photosizes)
+            yield photo
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photologue', '0002_photosize_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='cached_sizes',
+            field=models.TextField(default='', verbose_name='cached sizes', blank=True, editable=False),
+            preserve_default=False,
+        ),
+    ]
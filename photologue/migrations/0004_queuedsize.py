@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0001_initial'),
+        ('photologue', '0003_photo_cached_sizes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedSize',
+            fields=[
+                ('id', models.AutoField(primary_key=True, verbose_name='ID', serialize=False, auto_created=True)),
+                ('object_id', models.PositiveIntegerField()),
+                ('size_name', models.CharField(max_length=40)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed', models.DateTimeField(null=True, blank=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('content_type', models.ForeignKey(to='contenttypes.ContentType')),
+            ],
+            options={
+                'ordering': ['created'],
+                'verbose_name': 'queued size',
+                'verbose_name_plural': 'queued sizes',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='queuedsize',
+            unique_together=set([('content_type', 'object_id', 'size_name')]),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import photologue.models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photologue', '0004_queuedsize'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.AutoField(primary_key=True, verbose_name='ID', serialize=False, auto_created=True)),
+                ('title', models.CharField(max_length=50, verbose_name='title')),
+                ('caption', models.TextField(verbose_name='caption', blank=True)),
+                ('is_public', models.BooleanField(default=True, verbose_name='is public')),
+                ('tags', models.CharField(max_length=255, verbose_name='tags', blank=True)),
+                ('size', models.BigIntegerField(help_text='Size of the archive in bytes, if known in advance.', null=True, verbose_name='size', blank=True)),
+                ('received', models.BigIntegerField(default=0, verbose_name='received', editable=False)),
+                ('processed', models.BigIntegerField(default=0, editable=False)),
+                ('photo_count', models.PositiveIntegerField(default=0, verbose_name='photo count', editable=False)),
+                ('streaming', models.BooleanField(default=True, editable=False)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='created')),
+                ('claimed', models.DateTimeField(null=True, editable=False, blank=True)),
+                ('completed', models.DateTimeField(verbose_name='completed', null=True, editable=False, blank=True)),
+                ('gallery', models.ForeignKey(related_name='upload_sessions', verbose_name='gallery', to='photologue.Gallery')),
+            ],
+            options={
+                'ordering': ['-created'],
+                'verbose_name': 'upload session',
+                'verbose_name_plural': 'upload sessions',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='UploadChunk',
+            fields=[
+                ('id', models.AutoField(primary_key=True, verbose_name='ID', serialize=False, auto_created=True)),
+                ('offset', models.BigIntegerField()),
+                ('size', models.PositiveIntegerField()),
+                ('file', models.FileField(max_length=255, upload_to=photologue.models.get_chunk_path)),
+                ('session', models.ForeignKey(related_name='chunks', to='photologue.UploadSession')),
+            ],
+            options={
+                'ordering': ['offset'],
+                'verbose_name': 'upload chunk',
+                'verbose_name_plural': 'upload chunks',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='uploadchunk',
+            unique_together=set([('session', 'offset')]),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photologue', '0006_renditionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='renditionjob',
+            name='effect',
+            field=models.ForeignKey(blank=True, to='photologue.PhotoEffect', null=True),
+            preserve_default=True,
+        ),
+        migrations.AlterField(
+            model_name='renditionjob',
+            name='size_name',
+            field=models.CharField(max_length=40, blank=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='renditionjob',
+            unique_together=set([('content_type', 'size_name', 'effect')]),
+        ),
+    ]
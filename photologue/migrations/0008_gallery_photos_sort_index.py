@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+# The photos of a gallery are looked up by their position in it, see
+# Photo.get_neighbours(); the table is created by django-sortedm2m, so the index
+# cannot be declared on a model.
+INDEX_NAME = 'photologue_gallery_photos_sort'
+
+
+def add_index(apps, schema_editor):
+    through = apps.get_model('photologue', 'Gallery')._meta.get_field('photos').rel.through
+    qn = schema_editor.quote_name
+    schema_editor.execute('CREATE INDEX {0} ON {1} ({2}, {3})'.format(
+        qn(INDEX_NAME), qn(through._meta.db_table), qn('gallery_id'), qn('sort_value')))
+
+
+def remove_index(apps, schema_editor):
+    through = apps.get_model('photologue', 'Gallery')._meta.get_field('photos').rel.through
+    qn = schema_editor.quote_name
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX {0} ON {1}'.format(qn(INDEX_NAME), qn(through._meta.db_table)))
+    else:
+        schema_editor.execute('DROP INDEX {0}'.format(qn(INDEX_NAME)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photologue', '0007_renditionjob_effect'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photologue', '0008_gallery_photos_sort_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gallery',
+            name='photo_counts',
+            field=models.TextField(default='', verbose_name='photo counts', blank=True, editable=False),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photologue', '0009_gallery_photo_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='image_hash',
+            field=models.CharField(default='', verbose_name='image hash', max_length=32, blank=True, editable=False),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photologue', '0010_photo_image_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='renditionjob',
+            name='without_effect',
+            field=models.BooleanField(default=False),
+            preserve_default=True,
+        ),
+    ]
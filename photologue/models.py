@@ -1,11 +1,21 @@
 import os
+import re
+import json
+import math
+import time
+import uuid
 import random
+import hashlib
+import shutil
 import zipfile
-from datetime import datetime
+from datetime import datetime, timedelta
 from inspect import isclass
 import warnings
 import logging
+from functools import partial
 from io import BytesIO
+from multiprocessing.pool import ThreadPool
+from tempfile import SpooledTemporaryFile
 try:
     from importlib import import_module
 except ImportError:
@@ -14,21 +24,22 @@ except ImportError:
 
 import django
 from django.utils.timezone import now
-from django.db import models
-from django.db.models.signals import post_init, post_save
+from django.db import models, transaction, connection, connections, router, DatabaseError, IntegrityError
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
 from django.conf import settings
+from django.core.files import File
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django.core.urlresolvers import reverse
 from django.core.exceptions import ValidationError
 from django.template.defaultfilters import slugify
 from django.utils.encoding import force_text, smart_str, filepath_to_uri
-from django.utils.functional import curry
 from django.utils.translation import ugettext_lazy as _
 from django.utils.encoding import python_2_unicode_compatible
 from django.core.validators import RegexValidator
 from django.contrib import messages
 from django.contrib.sites.models import Site
+from django.contrib.contenttypes.models import ContentType
 
 # Required PIL classes may or may not be available from the root namespace
 # depending on the installation method used.
@@ -54,8 +65,11 @@ from model_utils.managers import PassThroughManager
 # otherwise we substitude a dummy TagField.
 try:
     from tagging.fields import TagField
+    from tagging.models import Tag
     tagfield_help_text = _('Separate tags with spaces, put quotes around multiple-word tags.')
 except ImportError:
+    Tag = None
+
     class TagField(models.CharField):
 
         def __init__(self, **kwargs):
@@ -74,8 +88,13 @@ except ImportError:
 
 from .utils import EXIF
 from .utils.reflection import add_reflection
-from .utils.watermark import apply_watermark
+from .utils.zipstream import ChunkedFile, read_member, IncompleteMember, UnsupportedMember
+from .utils.watermark import reduce_opacity, watermark_region, composite_region
+from .utils.caching import get_cache, LRUCache
 from .managers import GalleryQuerySet, PhotoQuerySet
+from .queues import get_queue, SynchronousQueue
+from .viewcounts import ViewCountBuffer
+from .signals import image_oversized
 
 logger = logging.getLogger('photologue.models')
 
@@ -95,9 +114,74 @@ SAMPLE_IMAGE_PATH = getattr(settings, 'PHOTOLOGUE_SAMPLE_IMAGE_PATH', os.path.jo
 # Modify image file buffer size.
 ImageFile.MAXBLOCK = getattr(settings, 'PHOTOLOGUE_MAXBLOCK', 256 * 2 ** 10)
 
+# When a JPEG is decoded at a reduced size, keep it at least this many times
+# larger than the photo sizes being created from it.
+DRAFT_OVERSAMPLING = 2
+
+# Maximum number of pixels that an image can be decoded at. Larger JPEG images
+# get decoded at a reduced scale, other images get rejected.
+MAX_PIXELS = getattr(settings, 'PHOTOLOGUE_MAX_PIXELS', None)
+
+# How often images went over MAX_PIXELS in this process, by outcome.
+oversized_image_counts = {'reduced': 0, 'rejected': 0}
+
+# Number of threads used to import the photos in a gallery zip upload; None imports
+# them one at a time.
+ZIP_IMPORT_WORKERS = getattr(settings, 'PHOTOLOGUE_ZIP_IMPORT_WORKERS', None)
+
+# After this many seconds, a chunked upload that a crashed process was busy with
+# can be taken over by another one.
+UPLOAD_CLAIM_TIMEOUT = 600
+
+# Number of seconds after which a chunked upload that was never completed is deleted,
+# with its chunks, by the plexpire management command.
+UPLOAD_SESSION_EXPIRY = getattr(settings, 'PHOTOLOGUE_UPLOAD_SESSION_EXPIRY', 24 * 60 * 60)
+
 # Photologue image path relative to media root
 PHOTOLOGUE_DIR = getattr(settings, 'PHOTOLOGUE_DIR', 'photologue')
 
+# Url that the paths of cached sizes in the storage are relative to, e.g. MEDIA_URL;
+# if set, the urls of cached sizes are built without calling the storage.
+RENDITION_BASE_URL = getattr(settings, 'PHOTOLOGUE_RENDITION_BASE_URL', None)
+
+# Number of watermark layers kept in memory by each process, ready to be applied
+# to images of the same size; each one takes 4 bytes per pixel that the watermark
+# covers.
+WATERMARK_CACHE_SIZE = getattr(settings, 'PHOTOLOGUE_WATERMARK_CACHE_SIZE', 8)
+
+# Decoded watermarks, and watermark layers for the last image sizes they were applied to.
+watermark_marks = LRUCache(WATERMARK_CACHE_SIZE)
+watermark_layers = LRUCache(WATERMARK_CACHE_SIZE)
+
+# Keys under which the photo sizes are kept in the cache, see PhotoSizeCache.
+SIZES_VERSION_KEY = 'photologue.photosizes.version'
+SIZES_KEY = 'photologue.photosizes.{0}'
+# How often each process checks whether the photo sizes have changed, in seconds.
+SIZES_CHECK_INTERVAL = 1
+# Each version of the photo sizes is kept in the cache for this long, in seconds.
+SIZES_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Keys under which the ids of the photos in each gallery are kept in the cache,
+# see Gallery.sample(). Each gallery has its own version, which is dropped when
+# photos are added to or removed from it, or change in a way that matters.
+GALLERY_IDS_VERSION_KEY = 'photologue.gallery_ids.version.{0}'
+GALLERY_IDS_KEY = 'photologue.gallery_ids.{0}.{1}.{2}.{3}'
+# The ids of the photos in a gallery are kept in the cache for this long, in seconds.
+GALLERY_IDS_CACHE_TIMEOUT = 60 * 60
+# Keys under which the id of the gallery with a given slug, and the url and title
+# of a photo in a given size, are kept in the cache, see get_random_photo(). The
+# first is dropped when the gallery is saved or deleted; the second shares the
+# version of the photo sizes, and is also dropped whenever the cached sizes of
+# the photo change. Both are kept for as long as the ids.
+GALLERY_SLUG_KEY = 'photologue.gallery_slug.{0}'
+RENDITION_KEY = 'photologue.rendition.{0}.{1}.{2}.{3}'
+
+# The number of galleries whose photo counts are written by each UPDATE.
+COUNT_UPDATE_BATCH_SIZE = 300
+
+# The names of the methods that ImageModel provides for each photo size.
+SIZE_ACCESSOR_RE = re.compile(r'^get_(.+)_(size|photosize|url|filename)$')
+
 # Look for user function to define file paths
 PHOTOLOGUE_PATH = getattr(settings, 'PHOTOLOGUE_PATH', None)
 if PHOTOLOGUE_PATH is not None:
@@ -156,6 +240,82 @@ IMAGE_FILTERS_HELP_TEXT = _(
     'Chain multiple filters using the following pattern "FILTER_ONE->FILTER_TWO->FILTER_THREE". Image filters will be applied in order. The following filters are available: %s.' % (', '.join(filter_names)))
 
 
+def exceeds_pixel_budget(size):
+    """Return True if an image of the supplied dimensions is over MAX_PIXELS."""
+    return MAX_PIXELS is not None and size[0] * size[1] > MAX_PIXELS
+
+
+def can_decode_within_budget(im):
+    """Return True if an opened (not yet decoded) image can be decoded
+    without going over MAX_PIXELS."""
+    if not exceeds_pixel_budget(im.size):
+        return True
+    # JPEGs can be decoded at up to 1/8 of their dimensions.
+    return im.format == 'JPEG' and not exceeds_pixel_budget((im.size[0] // 8, im.size[1] // 8))
+
+
+def report_oversized_image(instance, outcome):
+    oversized_image_counts[outcome] += 1
+    image_oversized.send(sender=instance.__class__, instance=instance, outcome=outcome)
+
+
+def spooled_file(file, name=None):
+    """Wrap a SpooledTemporaryFile for saving to a storage.
+
+    While its data is still in memory, a SpooledTemporaryFile has no name on
+    Python 3, and File cannot work out its size; so the size is set here.
+    """
+    file.seek(0, os.SEEK_END)
+    wrapped = File(file, name=name)
+    wrapped.size = file.tell()
+    file.seek(0)
+    return wrapped
+
+
+def remember_loaded_values(instance):
+    """Note the values of the fields named in the '_tracked_fields' of a model,
+    as loaded from the database or last saved, to tell later whether they have
+    been changed. Deferred fields are left out."""
+    instance._loaded_values = dict((name, instance.__dict__[name]) for name in instance._tracked_fields
+                                   if name in instance.__dict__)
+
+
+def exclude_from_save(instance, kwargs, names):
+    """Leave the named fields out of a save of an existing row, unless they have
+    been changed on the instance since it was loaded. Returns True if any field
+    was left out.
+
+    These fields are written on their own with QuerySet.update(), often by other
+    processes, so a save from an instance that was loaded before would otherwise
+    write their old values back. Pass 'update_fields' to save() to choose the
+    fields to write explicitly.
+    """
+    if instance._state.adding or kwargs.get('force_insert') or kwargs.get('update_fields') is not None:
+        return False
+    loaded = instance.__dict__.get('_loaded_values', {})
+    unchanged = [name for name in names if name in loaded and loaded[name] == instance.__dict__.get(name)]
+    if not unchanged:
+        return False
+    kwargs['update_fields'] = [field.name for field in instance._meta.concrete_fields
+                               if not field.primary_key and field.name not in unchanged]
+    return True
+
+
+def save_excluding(instance, save, names, args, kwargs):
+    """Call 'save', the save() method of the parent class of an instance, leaving
+    out the named fields as exclude_from_save() does. If the row has been
+    deleted meanwhile, it is inserted again, as an ordinary save would do."""
+    excluded = exclude_from_save(instance, kwargs, names)
+    try:
+        save(*args, **kwargs)
+    except DatabaseError as e:
+        if not excluded or 'did not affect any rows' not in force_text(e):
+            raise
+        del kwargs['update_fields']
+        save(*args, **kwargs)
+    remember_loaded_values(instance)
+
+
 @python_2_unicode_compatible
 class Gallery(models.Model):
     date_added = models.DateTimeField(_('date published'),
@@ -180,9 +340,15 @@ class Gallery(models.Model):
     tags = TagField(help_text=tagfield_help_text, verbose_name=_('tags'))
     sites = models.ManyToManyField(Site, verbose_name=_(u'sites'),
                                    blank=True, null=True)
+    photo_counts = models.TextField(_('photo counts'),
+                                    blank=True,
+                                    editable=False)
 
     objects = PassThroughManager.for_queryset_class(GalleryQuerySet)()
 
+    # The id of the gallery is cached by slug, see get_random_photo().
+    _tracked_fields = ('slug', 'photo_counts')
+
     class Meta:
         ordering = ['-date_added']
         get_latest_by = 'date_added'
@@ -192,38 +358,64 @@ class Gallery(models.Model):
     def __str__(self):
         return self.title
 
+    def __init__(self, *args, **kwargs):
+        super(Gallery, self).__init__(*args, **kwargs)
+        remember_loaded_values(self)
+
+    def save(self, *args, **kwargs):
+        # The photo counts are kept by update_gallery_photo_counts().
+        save_excluding(self, super(Gallery, self).save, ('photo_counts',), args, kwargs)
+
     def get_absolute_url(self):
         return reverse('pl-gallery', args=[self.slug])
 
     def latest(self, limit=LATEST_LIMIT, public=True):
-        if not limit:
-            limit = self.photo_count()
         if public:
-            return self.public()[:limit]
+            photos = self.public()
         else:
-            return self.photos.filter(sites__id=settings.SITE_ID)[:limit]
+            photos = self.photos.filter(sites__id=settings.SITE_ID)
+        if limit:
+            photos = photos[:limit]
+        return photos
 
     def sample(self, count=None, public=True):
         """Return a sample of photos, ordered at random.
         If the 'count' is not specified, it will return a number of photos
         limited by the GALLERY_SAMPLE_SIZE setting.
+
+        The photos are picked from a cached list of the ids of the photos in
+        the gallery, and only the chosen photos are loaded. Galleries loaded
+        with GalleryQuerySet.with_samples() already have their sample.
         """
-        if not count:
-            count = SAMPLE_SIZE
-        if count > self.photo_count():
-            count = self.photo_count()
-        if public:
-            photo_set = self.public()
-        else:
-            photo_set = self.photos.filter(sites__id=settings.SITE_ID)
-        return random.sample(set(photo_set), count)
+        if count is None and public and 'samples' in self.__dict__:
+            return self.samples
+        return pick_gallery_samples([self], count, public=public)[self.pk]
+
+    def photo_ids(self, public=True):
+        """Return the ids of the photos in this gallery.
+
+        The list is kept in Photologue's cache until a photo or a gallery
+        changes.
+        """
+        return get_gallery_photo_ids([self], public)[self.pk]
 
     def photo_count(self, public=True):
-        """Return a count of all the photos in this gallery."""
-        if public:
-            return self.public().count()
-        else:
-            return self.photos.filter(sites__id=settings.SITE_ID).count()
+        """Return a count of all the photos in this gallery.
+
+        The counts for each site are kept in the 'photo_counts' field, which
+        is updated whenever photos are added to or removed from the gallery, or
+        made public or private; galleries that have not been counted yet are
+        counted now. The field is updated in the database, so a gallery loaded
+        before such a change keeps returning the counts it was loaded with.
+        """
+        if not self.photo_counts:
+            update_gallery_photo_counts([self])
+        try:
+            counts = json.loads(self.photo_counts)
+        except ValueError:
+            counts = {}
+        public_count, total_count = counts.get(str(settings.SITE_ID), (0, 0))
+        return public_count if public else total_count
     photo_count.short_description = _('count')
 
     def public(self):
@@ -298,96 +490,533 @@ class GalleryUpload(models.Model):
         if default_storage.exists(self.zip_file.name):
             # TODO: implement try-except here
             zip = zipfile.ZipFile(default_storage.open(self.zip_file.name))
-            bad_file = zip.testzip()
-            if bad_file:
-                zip.close()
-                raise Exception('"%s" in the .zip archive is corrupt.' % bad_file)
-            count = 1
             current_site = Site.objects.get(id=settings.SITE_ID)
-            if self.gallery:
-                logger.debug('Using pre-existing gallery.')
-                gallery = self.gallery
+            gallery = self.get_gallery(current_site)
+            if ZIP_IMPORT_WORKERS:
+                self._import_photos_bulk(zip, gallery, current_site)
             else:
-                logger.debug(force_text('Creating new gallery "{0}".').format(self.title))
-                gallery = Gallery.objects.create(title=self.title,
-                                                 slug=slugify(self.title),
-                                                 description=self.description,
-                                                 is_public=self.is_public,
-                                                 tags=self.tags)
-                gallery.sites.add(current_site)
-            for filename in sorted(zip.namelist()):
-
-                logger.debug('Reading file "{0}".'.format(filename))
-
-                if filename.startswith('__') or filename.startswith('.'):
-                    logger.debug('Ignoring file "{0}".'.format(filename))
-                    continue
+                self._import_photos(zip, gallery, current_site)
+            zip.close()
+            return gallery
 
-                #if os.path.dirname(filename):
-                    #logger.warning('Ignoring file "{0}" as it is in a subfolder; all images should be in the top '
-                    #               'folder of the zip.'.format(filename))
-                    #if getattr(self, 'request', None):
-                    #    messages.warning(self.request,
-                    #                     _('Ignoring file "{filename}" as it is in a subfolder; all images should '
-                    #                       'be in the top folder of the zip.').format(filename=filename),
-                    #                     fail_silently=True)
-                    #continue
+    def get_gallery(self, current_site):
+        """Return the gallery to add the photos to, creating it if need be."""
+        if self.gallery:
+            logger.debug('Using pre-existing gallery.')
+            return self.gallery
+        logger.debug(force_text('Creating new gallery "{0}".').format(self.title))
+        gallery = Gallery.objects.create(title=self.title,
+                                         slug=slugify(self.title),
+                                         description=self.description,
+                                         is_public=self.is_public,
+                                         tags=self.tags)
+        gallery.sites.add(current_site)
+        return gallery
 
-                data = zip.read(filename)
+    def _import_photos(self, archive, gallery, current_site):
+        """Create and save the photos in the archive one at a time."""
+        count = 1
+        for info in self._get_members(archive):
+            file = self.extract(archive, info)
+            if file is not None and self.create_photo(info.filename, file, count, gallery, current_site):
+                count = count + 1
 
-                if not len(data):
-                    logger.debug('File "{0}" is empty.'.format(filename))
-                    continue
+    def create_photo(self, filename, file, count, gallery, current_site):
+        """Create a photo from a file in the archive, and add it to the gallery.
 
-                title = ' '.join([self.title, str(count)])
-                slug = slugify(title)
+        The file is closed afterwards. Returns True if a photo was created.
+        """
+        title = ' '.join([self.title, str(count)])
+        slug = slugify(title)
 
-                try:
-                    Photo.objects.get(slug=slug)
-                    logger.warning('Did not create photo "{0}" with slug "{1}" as a photo with that '
-                                   'slug already exists.'.format(filename, slug))
-                    if getattr(self, 'request', None):
-                        messages.warning(self.request,
-                                         _('Did not create photo "%(filename)s" with slug "{1}" as a photo with that '
-                                           'slug already exists.').format(filename, slug),
-                                         fail_silently=True)
-                    continue
-                except Photo.DoesNotExist:
-                    pass
+        try:
+            Photo.objects.get(slug=slug)
+            self._skip_duplicate(filename, slug)
+            file.close()
+            return False
+        except Photo.DoesNotExist:
+            pass
 
-                photo = Photo(title=title,
-                              slug=slug,
-                              caption=self.caption,
-                              is_public=self.is_public,
-                              tags=self.tags)
+        photo = Photo(title=title,
+                      slug=slug,
+                      caption=self.caption,
+                      is_public=self.is_public,
+                      tags=self.tags)
+
+        problem = self._check_image(file)
+        if problem:
+            self._skip_image(filename, problem, photo)
+            file.close()
+            return False
+
+        content = spooled_file(file, filename)
+        photo.hash_image(content)
+        photo.image.save(filename, content)
+        file.close()
+        photo.save()
+        photo.sites.add(current_site)
+        gallery.photos.add(photo)
+        return True
+
+    def _import_photos_bulk(self, archive, gallery, current_site):
+        """Create the photos in the archive with a pool of worker threads, and write
+        them to the database in bulk.
+
+        Only the calling thread reads the archive and uses the database; the workers
+        check, store and pre-cache the images. Photos are not saved one by one, so
+        nothing that hooks into Photo.save() or its signals runs for them.
+        """
+        members = self._get_members(archive)
+        slugs = [slugify(' '.join([self.title, str(count)])) for count in range(1, len(members) + 1)]
+        existing = set(Photo.objects.filter(slug__in=slugs).values_list('slug', flat=True))
+        # With the default queue, sizes to pre-cache are rendered by the workers too,
+        # before the photos are inserted; other queues get them once we have ids.
+        sizes = [photosize for photosize in PhotoSizeCache().sizes.values() if photosize.pre_cache]
+        render = isinstance(get_queue(), SynchronousQueue)
+
+        # The photos whose images have been stored.
+        photos = []
+        count = 1
+        try:
+            pool = ThreadPool(ZIP_IMPORT_WORKERS)
+            try:
+                # Extract a few files per worker at a time, so as to bound disk and memory use.
+                batch_size = ZIP_IMPORT_WORKERS * 4
+                for start in range(0, len(members), batch_size):
+                    batch = []
+                    for info in members[start:start + batch_size]:
+                        file = self.extract(archive, info)
+                        if file is not None:
+                            batch.append((info.filename, file))
+                    problems = pool.map(self._check_image, [file for filename, file in batch])
+
+                    jobs = []
+                    for (filename, file), problem in zip(batch, problems):
+                        slug = slugify(' '.join([self.title, str(count)]))
+                        if slug in existing:
+                            # The photos are numbered from count, so none of them can be created.
+                            self._skip_duplicate(filename, slug)
+                            file.close()
+                            continue
+                        photo = Photo(caption=self.caption,
+                                      is_public=self.is_public,
+                                      tags=self.tags,
+                                      cached_sizes='{}')
+                        if problem:
+                            self._skip_image(filename, problem, photo)
+                            file.close()
+                            continue
+                        jobs.append((photo, filename, file, sizes if render else []))
+                    stored = pool.map(_store_zip_photo, jobs)
+
+                    # Number the photos once their images are stored, so that the
+                    # ones that could not be stored leave no gaps.
+                    for (photo, filename, file, photo_sizes), ok in zip(jobs, stored):
+                        if not ok:
+                            self._skip_image(filename, 'invalid', photo)
+                            continue
+                        photo.title = ' '.join([self.title, str(count)])
+                        photo.slug = slugify(photo.title)
+                        if photo.slug in existing:
+                            self._skip_duplicate(filename, photo.slug)
+                            _discard_zip_photo(photo)
+                            continue
+                        photos.append(photo)
+                        count = count + 1
+            finally:
+                pool.close()
+                pool.join()
+
+            if not photos:
+                return
+            Photo.objects.bulk_create(photos)
+        except Exception:
+            # Don't leave behind the files of photos that never made it into the database.
+            for photo in photos:
+                _discard_zip_photo(photo)
+            raise
+        # Not every database returns the ids of the rows that bulk_create() inserted.
+        by_slug = dict((photo.slug, photo) for photo in Photo.objects.filter(slug__in=[p.slug for p in photos]))
+        photos = [by_slug[photo.slug] for photo in photos]
+
+        field = Photo._meta.get_field('sites')
+        field.rel.through.objects.bulk_create([
+            field.rel.through(**{field.m2m_field_name(): photo,
+                                 field.m2m_reverse_field_name(): current_site})
+            for photo in photos])
+
+        field = Gallery._meta.get_field('photos')
+        through = field.rel.through
+        sort_field_name = getattr(through, '_sort_field_name', 'sort_value')
+        last = through.objects.filter(**{field.m2m_field_name(): gallery}).aggregate(
+            last=models.Max(sort_field_name))['last']
+        first = 0 if last is None else last + 1
+        through.objects.bulk_create([
+            through(**{field.m2m_field_name(): gallery,
+                       field.m2m_reverse_field_name(): photo,
+                       sort_field_name: first + i})
+            for i, photo in enumerate(photos)])
+
+        # bulk_create() does not send the signals that keep the cached lists of ids,
+        # and the photo counts, up to date.
+        galleries_changed([gallery])
+
+        if Tag is not None and self.tags:
+            for photo in photos:
+                Tag.objects.update_tags(photo, self.tags)
+        if not render:
+            for photo in photos:
+                photo.pre_cache()
+
+    def _get_members(self, archive):
+        """Return the files in the archive that could be photos, in name order."""
+        return [info for info in sorted(archive.infolist(), key=lambda info: info.filename)
+                if self.is_wanted(info.filename, info.file_size)]
+
+    def is_wanted(self, filename, size):
+        """Return True if a file in the archive could be a photo."""
+        logger.debug('Reading file "{0}".'.format(filename))
+
+        if filename.startswith('__') or filename.startswith('.'):
+            logger.debug('Ignoring file "{0}".'.format(filename))
+            return False
+
+        #if os.path.dirname(filename):
+            #logger.warning('Ignoring file "{0}" as it is in a subfolder; all images should be in the top '
+            #               'folder of the zip.'.format(filename))
+            #if getattr(self, 'request', None):
+            #    messages.warning(self.request,
+            #                     _('Ignoring file "{filename}" as it is in a subfolder; all images should '
+            #                       'be in the top folder of the zip.').format(filename=filename),
+            #                     fail_silently=True)
+            #return False
+
+        if not size:
+            logger.debug('File "{0}" is empty.'.format(filename))
+            return False
+
+        return True
+
+    def extract(self, archive, info):
+        """Copy a file out of the archive, or return None if it is corrupt.
+
+        Reading the file through also checks its CRC. Small files are kept in
+        memory, larger ones go to a temporary file.
+        """
+        file = SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        try:
+            member = archive.open(info)
+            try:
+                shutil.copyfileobj(member, file)
+            finally:
+                member.close()
+        except Exception:
+            file.close()
+            self.skip_corrupt(info.filename)
+            return None
+        file.seek(0)
+        return file
+
+    def skip_corrupt(self, filename):
+        logger.error('"{0}" in the .zip archive is corrupt.'.format(filename))
+        self._warn(_('"{0}" in the .zip archive is corrupt.').format(filename))
+
+    def _check_image(self, file):
+        """Basic check that we have a valid image; return what is wrong with it, if anything."""
+        try:
+            opened = Image.open(file)
+            if not can_decode_within_budget(opened):
+                return 'oversized'
+            opened.verify()
+        except Exception:
+            # Pillow (or PIL) doesn't recognize it as an image.
+            return 'invalid'
+        finally:
+            file.seek(0)
+        return None
 
-                # Basic check that we have a valid image.
-                try:
-                    file = BytesIO(data)
-                    opened = Image.open(file)
-                    opened.verify()
-                except Exception:
-                    # Pillow (or PIL) doesn't recognize it as an image.
-                    # If a "bad" file is found we just skip it.
-                    # But we do flag this both in the logs and to the user.
-                    logger.error('Could not process file "{0}" in the .zip archive.'.format(
-                        filename))
-                    if getattr(self, 'request', None):
-                        messages.warning(self.request,
-                                         _('Could not process file "{0}" in the .zip archive.').format(
-                                         filename,
-                                         fail_silently=True))
-                    continue
+    def _skip_image(self, filename, problem, photo):
+        # If a "bad" file is found we just skip it.
+        # But we do flag this both in the logs and to the user.
+        if problem == 'oversized':
+            logger.error('File "{0}" in the .zip archive is too large to process.'.format(filename))
+            report_oversized_image(photo, 'rejected')
+            self._warn(_('File "{0}" in the .zip archive is too large to process.').format(filename))
+        else:
+            logger.error('Could not process file "{0}" in the .zip archive.'.format(filename))
+            self._warn(_('Could not process file "{0}" in the .zip archive.').format(filename))
 
-                contentfile = ContentFile(data)
-                photo.image.save(filename, contentfile)
-                photo.save()
-                photo.sites.add(current_site)
-                gallery.photos.add(photo)
-                count = count + 1
+    def _skip_duplicate(self, filename, slug):
+        logger.warning('Did not create photo "{0}" with slug "{1}" as a photo with that '
+                       'slug already exists.'.format(filename, slug))
+        self._warn(_('Did not create photo "%(filename)s" with slug "{1}" as a photo with that '
+                     'slug already exists.').format(filename, slug))
 
-            zip.close()
-            return gallery
+    def _warn(self, message):
+        if getattr(self, 'request', None):
+            messages.warning(self.request, message, fail_silently=True)
+
+
+def _store_zip_photo(job):
+    """Store the image of a photo from a zip upload, and pre-cache its sizes.
+
+    Returns False if this failed, in which case whatever was stored is deleted.
+    """
+    photo, filename, file, sizes = job
+    try:
+        content = spooled_file(file, filename)
+        photo.hash_image(content)
+        photo.image.save(filename, content, save=False)
+        photo._set_date_taken()
+        if sizes:
+            photo.create_sizes(sizes)
+    except Exception:
+        logger.exception('Could not store file "{0}" from the .zip archive.'.format(filename))
+        _discard_zip_photo(photo)
+        return False
+    finally:
+        file.close()
+    return True
+
+
+def _discard_zip_photo(photo):
+    """Delete the stored image, and cached sizes, of a photo from a zip upload
+    that is not saved to the database."""
+    if not photo.image.name:
+        return
+    try:
+        photo.clear_cache()
+        photo.image.delete(save=False)
+    except Exception:
+        logger.exception('Could not delete "{0}".'.format(photo.image.name))
+
+
+def get_chunk_path(instance, filename):
+    return os.path.join(PHOTOLOGUE_DIR, 'temp', 'uploads', str(instance.session_id), filename)
+
+
+@python_2_unicode_compatible
+class UploadSession(models.Model):
+
+    """A gallery zip archive that is uploaded in chunks.
+
+    The chunks are only stored as they arrive; the photos in the archive are
+    created by complete(), once the whole archive is there. Uploads that are
+    never completed are deleted by delete_expired(). See
+    photologue.views.UploadView for the HTTP API.
+    """
+
+    gallery = models.ForeignKey(Gallery,
+                                related_name='upload_sessions',
+                                verbose_name=_('gallery'))
+    title = models.CharField(_('title'),
+                             max_length=50)
+    caption = models.TextField(_('caption'),
+                               blank=True)
+    is_public = models.BooleanField(_('is public'),
+                                    default=True)
+    tags = models.CharField(_('tags'),
+                            max_length=255,
+                            blank=True)
+    size = models.BigIntegerField(_('size'),
+                                  null=True,
+                                  blank=True,
+                                  help_text=_('Size of the archive in bytes, if known in advance.'))
+    received = models.BigIntegerField(_('received'),
+                                      default=0,
+                                      editable=False)
+    # Offset in the archive up to which the photos have been created.
+    processed = models.BigIntegerField(default=0,
+                                       editable=False)
+    photo_count = models.PositiveIntegerField(_('photo count'),
+                                              default=0,
+                                              editable=False)
+    # False once the archive can no longer be read before it has fully arrived.
+    streaming = models.BooleanField(default=True,
+                                    editable=False)
+    created = models.DateTimeField(_('created'),
+                                   default=now)
+    claimed = models.DateTimeField(null=True,
+                                   blank=True,
+                                   editable=False)
+    completed = models.DateTimeField(_('completed'),
+                                     null=True,
+                                     blank=True,
+                                     editable=False)
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name = _('upload session')
+        verbose_name_plural = _('upload sessions')
+
+    def __str__(self):
+        return self.title
+
+    def add_chunk(self, offset, file):
+        """Store the chunk of the archive that starts at offset.
+
+        Data that has already been received is ignored, so a chunk can safely be
+        sent again, e.g. after a dropped connection. Returns False if the chunk
+        would leave a gap after the data received so far.
+        """
+        if offset > self.received:
+            return False
+        file.seek(0, os.SEEK_END)
+        size = file.tell() - (self.received - offset)
+        if size <= 0:
+            return True
+        tail = None
+        if offset < self.received:
+            tail = SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+            file.seek(self.received - offset)
+            shutil.copyfileobj(file, tail)
+
+        chunk = UploadChunk(session=self, offset=self.received, size=size)
+        try:
+            with transaction.atomic():
+                chunk.file.save('{0:015d}'.format(chunk.offset), spooled_file(file if tail is None else tail))
+        except IntegrityError:
+            # Another request stored the same chunk in the meantime.
+            chunk.file.delete(save=False)
+            chunk = UploadChunk.objects.get(session=self, offset=chunk.offset)
+        finally:
+            if tail is not None:
+                tail.close()
+        received = chunk.offset + chunk.size
+        UploadSession.objects.filter(pk=self.pk, received__lt=received).update(received=received)
+        self.received = max(self.received, received)
+        return True
+
+    @classmethod
+    def delete_expired(cls):
+        """Delete the uploads that were started more than UPLOAD_SESSION_EXPIRY
+        seconds ago and never completed, with their chunks; returns how many were
+        deleted. Uploads that a process is busy with are left alone."""
+        started = now() - timedelta(seconds=UPLOAD_SESSION_EXPIRY)
+        claimed = now() - timedelta(seconds=UPLOAD_CLAIM_TIMEOUT)
+        sessions = cls.objects.filter(completed__isnull=True, created__lt=started).exclude(claimed__gte=claimed)
+        count = 0
+        for session in sessions:
+            session.delete()
+            count += 1
+        return count
+
+    def complete(self):
+        """Create the photos once the whole archive has arrived, then delete the
+        chunks.
+
+        Raises zipfile.BadZipfile if the archive is not a valid zip file. Returns
+        False if another process is busy with this session.
+        """
+        if not self._claim():
+            return False
+        try:
+            self._refresh()
+            if self.completed:
+                return True
+            upload = self.get_upload()
+            current_site = Site.objects.get(id=settings.SITE_ID)
+            self._process_received(upload, current_site)
+            self.streaming = False
+
+            # Whatever is left could not be read from the local headers, so read
+            # the central directory at the end of the archive instead.
+            archive = self._open()
+            try:
+                zip = zipfile.ZipFile(archive)
+                for info in sorted(zip.infolist(), key=lambda info: info.header_offset):
+                    if info.header_offset < self.processed:
+                        continue
+                    if upload.is_wanted(info.filename, info.file_size):
+                        file = upload.extract(zip, info)
+                        if file is not None and upload.create_photo(info.filename, file, self.photo_count + 1,
+                                                                    self.gallery, current_site):
+                            self.photo_count += 1
+                    self.processed = info.header_offset + 1
+                    self._save_progress()
+                zip.close()
+            finally:
+                archive.close()
+
+            self.completed = now()
+            UploadSession.objects.filter(pk=self.pk).update(completed=self.completed)
+            self.chunks.all().delete()
+        finally:
+            self._release()
+        return True
+
+    def get_upload(self):
+        """Return an unsaved GalleryUpload, which does the work of creating the photos."""
+        return GalleryUpload(title=self.title,
+                             gallery=self.gallery,
+                             caption=self.caption,
+                             is_public=self.is_public,
+                             tags=self.tags)
+
+    def _process_received(self, upload, current_site):
+        """Create the photos that follow each other from the start of the archive."""
+        archive = self._open()
+        try:
+            while self.streaming:
+                archive.seek(self.processed)
+                try:
+                    member = read_member(archive, self.received, settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+                except IncompleteMember:
+                    break
+                except UnsupportedMember:
+                    member = None
+                if member is None:
+                    self.streaming = False
+                elif member.file is None:
+                    upload.skip_corrupt(member.filename)
+                elif not upload.is_wanted(member.filename, member.size):
+                    member.file.close()
+                elif upload.create_photo(member.filename, member.file, self.photo_count + 1,
+                                         self.gallery, current_site):
+                    self.photo_count += 1
+                if member is not None:
+                    self.processed = member.stop
+                self._save_progress()
+        finally:
+            archive.close()
+
+    def _open(self):
+        """Return the archive as received so far, as a file."""
+        return ChunkedFile(default_storage,
+                           [(chunk.offset, chunk.size, chunk.file.name) for chunk in self.chunks.all()])
+
+    def _save_progress(self):
+        UploadSession.objects.filter(pk=self.pk).update(processed=self.processed,
+                                                        photo_count=self.photo_count,
+                                                        streaming=self.streaming)
+
+    def _claim(self):
+        expired = now() - timedelta(seconds=UPLOAD_CLAIM_TIMEOUT)
+        return UploadSession.objects.filter(pk=self.pk).filter(
+            models.Q(claimed__isnull=True) | models.Q(claimed__lt=expired)).update(claimed=now()) == 1
+
+    def _release(self):
+        UploadSession.objects.filter(pk=self.pk).update(claimed=None)
+
+    def _refresh(self):
+        fresh = UploadSession.objects.get(pk=self.pk)
+        for name in ('received', 'processed', 'photo_count', 'streaming', 'completed'):
+            setattr(self, name, getattr(fresh, name))
+
+
+class UploadChunk(models.Model):
+    session = models.ForeignKey(UploadSession,
+                                related_name='chunks')
+    offset = models.BigIntegerField()
+    size = models.PositiveIntegerField()
+    file = models.FileField(max_length=255,
+                            upload_to=get_chunk_path)
+
+    class Meta:
+        ordering = ['offset']
+        unique_together = (('session', 'offset'),)
+        verbose_name = _('upload chunk')
+        verbose_name_plural = _('upload chunks')
 
 
 class ImageModel(models.Model):
@@ -411,10 +1040,23 @@ class ImageModel(models.Model):
                                blank=True,
                                related_name="%(class)s_related",
                                verbose_name=_('effect'))
+    cached_sizes = models.TextField(_('cached sizes'),
+                                    blank=True,
+                                    editable=False)
+    image_hash = models.CharField(_('image hash'),
+                                  max_length=32,
+                                  blank=True,
+                                  editable=False)
+
+    _tracked_fields = ('cached_sizes', 'view_count')
 
     class Meta:
         abstract = True
 
+    def __init__(self, *args, **kwargs):
+        super(ImageModel, self).__init__(*args, **kwargs)
+        remember_loaded_values(self)
+
     @property
     def EXIF(self):
         try:
@@ -454,10 +1096,24 @@ class ImageModel(models.Model):
     def image_filename(self):
         return os.path.basename(force_text(self.image.name))
 
-    def _get_filename_for_size(self, size):
+    def _get_filename_for_size(self, size, version=None):
+        """Cached sizes are named after the version they were rendered from, so
+        that a new version gets a new url; those cached before versions were
+        recorded have no version in their name."""
         size = getattr(size, 'name', size)
         base, ext = os.path.splitext(self.image_filename())
-        return ''.join([base, '_', size, ext])
+        if version is None:
+            return ''.join([base, '_', size, ext])
+        return ''.join([base, '_', size, '_', version, ext])
+
+    def _get_size_path(self, photosize):
+        """Return the path of the up to date version of a cached size, whether
+        or not it exists yet."""
+        version = self._get_size_version(photosize)
+        entry = self._get_manifest().get(photosize.name)
+        if entry is not None and entry.get('version') == version and entry.get('path'):
+            return entry['path']
+        return os.path.join(self.cache_path(), self._get_filename_for_size(photosize, version))
 
     def _get_SIZE_photosize(self, size):
         return PhotoSizeCache().sizes.get(size)
@@ -466,48 +1122,197 @@ class ImageModel(models.Model):
         photosize = PhotoSizeCache().sizes.get(size)
         if not self.size_exists(photosize):
             self.create_size(photosize)
+        entry = self._get_manifest().get(photosize.name)
+        if entry is not None and 'width' in entry:
+            return (entry['width'], entry['height'])
         return Image.open(self.image.storage.open(
             self._get_SIZE_filename(size))).size
 
     def _get_SIZE_url(self, size):
         photosize = PhotoSizeCache().sizes.get(size)
-        if not self.size_exists(photosize):
-            self.create_size(photosize)
+        url = self.__dict__.get('rendition_urls', {}).get(size)
+        if url is None:
+            if not self.size_exists(photosize):
+                get_queue().enqueue(self, [photosize])
+            url = self._get_size_url(photosize)
         if photosize.increment_count:
             self.increment_count()
-        return '/'.join([
-            self.cache_url(),
-            filepath_to_uri(self._get_filename_for_size(photosize.name))])
+        return url
+
+    def _get_size_url(self, photosize, cache_url=None):
+        """Build the url of a cached size, without checking that it exists.
+
+        With PHOTOLOGUE_RENDITION_BASE_URL set, this does not involve the storage.
+        """
+        path = self._get_size_path(photosize)
+        if RENDITION_BASE_URL is None:
+            return '/'.join([cache_url or self.cache_url(),
+                             filepath_to_uri(os.path.basename(path))])
+        return RENDITION_BASE_URL + filepath_to_uri(path)
+
+    def set_rendition_urls(self, photosizes):
+        """Work out the urls of several cached sizes in one go; get_SIZE_url()
+        then returns them straight away. Sizes that do not exist yet are queued
+        for creation."""
+        missing = [photosize for photosize in photosizes if not self.size_exists(photosize)]
+        if missing:
+            get_queue().enqueue(self, missing)
+        cache_url = self.cache_url() if RENDITION_BASE_URL is None else None
+        self.rendition_urls = dict((photosize.name, self._get_size_url(photosize, cache_url))
+                                   for photosize in photosizes)
 
     def _get_SIZE_filename(self, size):
         photosize = PhotoSizeCache().sizes.get(size)
-        return smart_str(os.path.join(self.cache_path(),
-                                      self._get_filename_for_size(photosize.name)))
+        if photosize is None:
+            return smart_str(os.path.join(self.cache_path(),
+                                          self._get_filename_for_size(size)))
+        return smart_str(self._get_size_path(photosize))
+
+    def _get_size_version(self, photosize):
+        """Return a key identifying everything a cached size is rendered from.
+
+        A cached size recorded with a different key is stale.
+        """
+        if self.effect_id is not None:
+            effect_signature = self.effect.signature()
+        else:
+            effect_signature = ''
+        # The effect of the photo size is not used if the photo has its own.
+        parts = [force_text(self.image.name),
+                 force_text(self.crop_from),
+                 effect_signature,
+                 photosize.signature(effect=self.effect_id is None)]
+        if self.image_hash:
+            parts.append(self.image_hash)
+        key = '|'.join(parts)
+        return hashlib.md5(key.encode('utf-8')).hexdigest()[:12]
+
+    def hash_image(self, content):
+        """Record a digest of the contents of a new image, so that replacing the
+        image with another one of the same name is noticed."""
+        digest = hashlib.md5()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        self.image_hash = digest.hexdigest()
+
+    def _get_manifest(self):
+        """Return the record of cached sizes, as a dict keyed by size name."""
+        if getattr(self, '_manifest_source', None) != self.cached_sizes:
+            self._manifest = self._parse_manifest(self.cached_sizes)
+            self._manifest_source = self.cached_sizes
+        return self._manifest
+
+    def _parse_manifest(self, source):
+        try:
+            return json.loads(source) if source else {}
+        except ValueError:
+            return {}
+
+    def _update_manifest(self, changes):
+        """Store changes to the record of cached sizes, without going through
+        save(). ``changes`` maps size names to their new entry, or to None to
+        drop the entry this instance knows of.
+
+        The changes are merged into the record as it is in the database, with
+        the row locked, so that processes creating different sizes of the same
+        photo do not lose each other's entries. An entry is only dropped if no
+        other process has replaced it meanwhile.
+        """
+        known = self._get_manifest()
+        pk = self._get_pk_val()
+        with transaction.atomic():
+            source = None
+            if pk is not None:
+                source = self.__class__._default_manager.select_for_update().filter(pk=pk) \
+                                                        .values_list('cached_sizes', flat=True).first()
+            manifest = self._parse_manifest(self.cached_sizes if source is None else source)
+            for name, entry in changes.items():
+                if entry is not None:
+                    manifest[name] = entry
+                elif manifest.get(name) == known.get(name):
+                    manifest.pop(name, None)
+            self.cached_sizes = json.dumps(manifest, sort_keys=True)
+            if source is not None:
+                self.__class__._default_manager.filter(pk=pk).update(cached_sizes=self.cached_sizes)
+                # The record is saved, so save() has nothing to write.
+                self._loaded_values['cached_sizes'] = self.cached_sizes
+        self._manifest = manifest
+        self._manifest_source = self.cached_sizes
+        if pk is not None:
+            forget_renditions(self, set(known).union(manifest))
+
+    def _get_size_entry(self, photosize, im, size_bytes, path):
+        return {'version': self._get_size_version(photosize),
+                'path': path,
+                'width': im.size[0],
+                'height': im.size[1],
+                'bytes': size_bytes}
+
+    def _record_size(self, photosize, im, size_bytes, path):
+        self._update_manifest({photosize.name: self._get_size_entry(photosize, im, size_bytes, path)})
 
     def increment_count(self):
+        # The view is written by the buffer, not by save().
         self.view_count += 1
-        models.Model.save(self)
+        if 'view_count' in self._loaded_values:
+            self._loaded_values['view_count'] += 1
+        ViewCountBuffer().add(self)
+
+    def __getattr__(self, name):
+        """Provide get_SIZE_size(), get_SIZE_photosize(), get_SIZE_url() and
+        get_SIZE_filename() for each photo size.
+
+        This is only called for attributes that are not found the usual way, so
+        it costs nothing when creating instances.
+        """
+        match = SIZE_ACCESSOR_RE.match(name)
+        if match is not None and match.group(1) in PhotoSizeCache().sizes:
+            return partial(getattr(self, '_get_SIZE_' + match.group(2)), match.group(1))
+        raise AttributeError("'{0}' object has no attribute '{1}'".format(self.__class__.__name__, name))
 
     def add_accessor_methods(self, *args, **kwargs):
-        for size in PhotoSizeCache().sizes.keys():
-            setattr(self, 'get_%s_size' % size,
-                    curry(self._get_SIZE_size, size=size))
-            setattr(self, 'get_%s_photosize' % size,
-                    curry(self._get_SIZE_photosize, size=size))
-            setattr(self, 'get_%s_url' % size,
-                    curry(self._get_SIZE_url, size=size))
-            setattr(self, 'get_%s_filename' % size,
-                    curry(self._get_SIZE_filename, size=size))
+        warnings.warn(
+            DeprecationWarning('add_accessor_methods() is no longer needed, as the get_SIZE_*() methods are '
+                               'always available. It will be removed in Photologue 3.2.'))
 
     def size_exists(self, photosize):
-        func = getattr(self, "get_%s_filename" % photosize.name, None)
-        if func is not None:
-            if self.image.storage.exists(func()):
-                return True
-        return False
+        """Check the record of cached sizes; the storage is only queried for
+        images that were cached before that record existed."""
+        if not self.cached_sizes and self._get_pk_val() is not None:
+            self._record_legacy_sizes(photosize)
+        entry = self._get_manifest().get(photosize.name)
+        return entry is not None and entry.get('version') == self._get_size_version(photosize)
+
+    def _record_legacy_sizes(self, photosize):
+        """Look in the storage for the sizes cached under their old names, before
+        the record of cached sizes existed, and record them all in one go. The
+        record is saved even if none were found, so this only happens once."""
+        photosizes = dict(PhotoSizeCache().sizes)
+        photosizes[photosize.name] = photosize
+        storage = self.image.storage
+        manifest = {}
+        for size in photosizes.values():
+            filename = os.path.join(self.cache_path(), self._get_filename_for_size(size))
+            if not storage.exists(filename):
+                continue
+            f = storage.open(filename)
+            try:
+                manifest[size.name] = self._get_size_entry(size, Image.open(f),
+                                                           storage.size(filename), filename)
+            except IOError:
+                pass
+            finally:
+                f.close()
+        self._update_manifest(manifest)
 
-    def resize_image(self, im, photosize):
-        cur_width, cur_height = im.size
+    def _get_resize_geometry(self, size, photosize):
+        """Work out how an image of the supplied dimensions gets resized for a
+        photo size.
+
+        Returns the dimensions to resize to and the box to then crop to (or
+        None), or None if the image should be used as it is.
+        """
+        cur_width, cur_height = size
         new_width, new_height = photosize.size
         if photosize.crop:
             ratio = max(float(new_width) / cur_width, float(new_height) / cur_height)
@@ -529,7 +1334,7 @@ class ImageModel(models.Model):
                 box = (int(xd), int(y_diff), int(x), int(y_diff + new_height))
             else:
                 box = (int(x_diff), int(y_diff), int(x_diff + new_width), int(y_diff + new_height))
-            im = im.resize((int(x), int(y)), Image.ANTIALIAS).crop(box)
+            return (int(x), int(y)), box
         else:
             if not new_width == 0 and not new_height == 0:
                 ratio = min(float(new_width) / cur_width,
@@ -544,12 +1349,32 @@ class ImageModel(models.Model):
             if new_dimensions[0] > cur_width or \
                new_dimensions[1] > cur_height:
                 if not photosize.upscale:
-                    return im
-            im = im.resize(new_dimensions, Image.ANTIALIAS)
+                    return None
+            return new_dimensions, None
+
+    def resize_image(self, im, photosize):
+        geometry = self._get_resize_geometry(im.size, photosize)
+        if geometry is None:
+            return im
+        new_dimensions, box = geometry
+        im = im.resize(new_dimensions, Image.ANTIALIAS)
+        if box is not None:
+            im = im.crop(box)
         return im
 
     def create_size(self, photosize):
-        if self.size_exists(photosize):
+        self.create_sizes([photosize])
+
+    def create_sizes(self, photosizes):
+        """Create several sizes, opening and decoding the original image only once.
+
+        Sizes that share an effect share its pre-processing. They are then
+        rendered from the largest to the smallest, each one being resized from
+        the smallest image rendered so far that is still at least as large.
+        """
+        photosizes = [photosize for photosize in photosizes
+                      if not self.size_exists(photosize)]
+        if not photosizes:
             return
         try:
             im = Image.open(self.image.storage.open(self.image.name))
@@ -557,24 +1382,135 @@ class ImageModel(models.Model):
             return
         # Save the original format
         im_format = im.format
-        # Apply effect if found
-        if self.effect is not None:
-            im = self.effect.pre_process(im)
-        elif photosize.effect is not None:
-            im = photosize.effect.pre_process(im)
-        # Resize/crop image
-        if im.size != photosize.size and photosize.size != (0, 0):
-            im = self.resize_image(im, photosize)
-        # Apply watermark if found
-        if photosize.watermark is not None:
-            im = photosize.watermark.post_process(im)
-        # Apply effect if found
-        if self.effect is not None:
-            im = self.effect.post_process(im)
-        elif photosize.effect is not None:
-            im = photosize.effect.post_process(im)
-        # Save file
-        im_filename = getattr(self, "get_%s_filename" % photosize.name)()
+        original_size = im.size
+        self._draft(im, photosizes)
+        if exceeds_pixel_budget(original_size):
+            if exceeds_pixel_budget(im.size):
+                logger.error('Not creating sizes of "{0}": at {1}x{2} pixels it is over the '
+                             'PHOTOLOGUE_MAX_PIXELS limit.'.format(self.image.name, *original_size))
+                report_oversized_image(self, 'rejected')
+                return
+            logger.warning('"{0}" is over the PHOTOLOGUE_MAX_PIXELS limit, decoding it at '
+                           '{1}x{2} pixels.'.format(self.image.name, *im.size))
+            report_oversized_image(self, 'reduced')
+        # Group the sizes by the effect that applies to them.
+        groups = {}
+        for photosize in photosizes:
+            effect = self.effect if self.effect is not None else photosize.effect
+            key = effect.pk if effect is not None else None
+            groups.setdefault(key, (effect, []))[1].append(photosize)
+        for effect, group in groups.values():
+            # Apply effect if found
+            if effect is not None:
+                base = effect.pre_process(im)
+            else:
+                base = im
+            # Work from the dimensions of the full size image, even if the
+            # decoder has downscaled it.
+            if base.size == im.size:
+                size = original_size
+            elif base.size == im.size[::-1]:
+                size = original_size[::-1]
+            else:
+                size = (int(round(base.size[0] * float(original_size[0]) / im.size[0])),
+                        int(round(base.size[1] * float(original_size[1]) / im.size[1])))
+            renders = []
+            for photosize in group:
+                if size != photosize.size and photosize.size != (0, 0):
+                    geometry = self._get_resize_geometry(size, photosize)
+                else:
+                    geometry = None
+                renders.append((geometry, photosize))
+            # Largest first (sizes that use the image as it is do not resize
+            # anything, so where they come does not matter).
+            renders.sort(key=lambda render: 0 if render[0] is None else
+                         -render[0][0][0] * render[0][0][1])
+            # Resized versions of the whole image, from the largest to the smallest.
+            intermediates = [base]
+            for geometry, photosize in renders:
+                if geometry is None:
+                    sized = base
+                else:
+                    new_dimensions, box = geometry
+                    source = base
+                    for intermediate in reversed(intermediates):
+                        if intermediate.size[0] >= new_dimensions[0] and \
+                           intermediate.size[1] >= new_dimensions[1]:
+                            source = intermediate
+                            break
+                    sized = source.resize(new_dimensions, Image.ANTIALIAS)
+                    if new_dimensions[0] <= base.size[0] and \
+                       new_dimensions[1] <= base.size[1]:
+                        # Never resize from an upscaled image.
+                        intermediates.append(sized)
+                    if box is not None:
+                        sized = sized.crop(box)
+                # Apply watermark if found
+                if photosize.watermark is not None:
+                    sized = photosize.watermark.post_process(sized)
+                # Apply effect if found
+                if effect is not None:
+                    sized = effect.post_process(sized)
+                self._save_size(sized, photosize, im_format)
+
+    def _draft(self, im, photosizes):
+        """Let the JPEG decoder downscale a large image while decoding it, which
+        is much faster and uses much less memory than a full decode.
+
+        This is done if all the sizes are at least twice smaller than the
+        image - the decoded image is then kept at least twice as large as any
+        of them, so the final resize still has plenty of pixels to work from -
+        or if the image is over the PHOTOLOGUE_MAX_PIXELS budget.
+        """
+        if im.format != 'JPEG':
+            return
+        scale = self._get_draft_scale(im, photosizes)
+        if exceeds_pixel_budget(im.size):
+            # The decoder can scale by 1/2, 1/4 or 1/8.
+            for reduction in (2, 4, 8):
+                if exceeds_pixel_budget((im.size[0] // reduction, im.size[1] // reduction)):
+                    continue
+                break
+            scale = min(scale, 1.0 / reduction)
+        if scale > 0.5:
+            # The decoder can at best halve the image, nothing to gain.
+            return
+        im.draft(im.mode, (int(math.ceil(im.size[0] * scale)),
+                           int(math.ceil(im.size[1] * scale))))
+
+    def _get_draft_scale(self, im, photosizes):
+        scale = 0
+        for photosize in photosizes:
+            sizes = [im.size]
+            effect = self.effect if self.effect is not None else photosize.effect
+            if effect is not None and \
+               getattr(effect, 'transpose_method', 'ROTATE_90') in ('ROTATE_90', 'ROTATE_270'):
+                # The effect (may) rotate the image.
+                sizes.append(im.size[::-1])
+            for size in sizes:
+                if size == photosize.size or photosize.size == (0, 0):
+                    return 1.0
+                geometry = self._get_resize_geometry(size, photosize)
+                if geometry is None:
+                    return 1.0
+                new_dimensions = geometry[0]
+                scale = max(scale,
+                            float(new_dimensions[0]) / size[0],
+                            float(new_dimensions[1]) / size[1])
+        return scale * DRAFT_OVERSAMPLING
+
+    def _save_size(self, im, photosize, im_format):
+        legacy_filename = os.path.join(self.cache_path(), self._get_filename_for_size(photosize))
+        entry = self._get_manifest().get(photosize.name)
+        if entry is not None:
+            # A previous version of this size is still in the storage.
+            self.image.storage.delete(entry.get('path') or legacy_filename)
+        im_filename = os.path.join(self.cache_path(),
+                                   self._get_filename_for_size(photosize, self._get_size_version(photosize)))
+        if self.image.storage.exists(im_filename):
+            # The same version, rendered by a process whose record was lost;
+            # replace it rather than change its url.
+            self.image.storage.delete(im_filename)
         try:
             buffer = BytesIO()
             if im_format != 'JPEG':
@@ -583,31 +1519,61 @@ class ImageModel(models.Model):
                 im.save(buffer, 'JPEG', quality=int(photosize.quality),
                         optimize=True)
             buffer_contents = ContentFile(buffer.getvalue())
-            self.image.storage.save(im_filename, buffer_contents)
+            im_filename = self.image.storage.save(im_filename, buffer_contents)
         except IOError as e:
             if self.image.storage.exists(im_filename):
                 self.image.storage.delete(im_filename)
             raise e
-
-    def remove_size(self, photosize, remove_dirs=True):
-        if not self.size_exists(photosize):
-            return
-        filename = getattr(self, "get_%s_filename" % photosize.name)()
+        self._record_size(photosize, im, buffer_contents.size, im_filename)
+
+    def _remove_size(self, photosize, manifest):
+        """Delete a cached size (stale or not) from the storage and drop it from
+        the supplied manifest. Returns True if anything was removed."""
+        name = getattr(photosize, 'name', photosize)
+        filename = os.path.join(self.cache_path(), self._get_filename_for_size(name))
+        entry = manifest.pop(name, None)
+        if entry is not None:
+            self.image.storage.delete(entry.get('path') or filename)
+            return True
         if self.image.storage.exists(filename):
             self.image.storage.delete(filename)
+            return True
+        return False
+
+    def remove_size(self, photosize, remove_dirs=True):
+        if self._remove_size(photosize, dict(self._get_manifest())):
+            self._update_manifest({getattr(photosize, 'name', photosize): None})
 
     def clear_cache(self):
         cache = PhotoSizeCache()
-        for photosize in cache.sizes.values():
-            self.remove_size(photosize, False)
+        manifest = dict(self._get_manifest())
+        removed = [photosize.name for photosize in cache.sizes.values()
+                   if self._remove_size(photosize, manifest)]
+        if removed:
+            self._update_manifest(dict((name, None) for name in removed))
+
+    def sweep_cache(self):
+        """Delete the cached sizes that are stale, or whose photo size no longer
+        exists. Returns the number of cached sizes deleted."""
+        sizes = PhotoSizeCache().sizes
+        manifest = self._get_manifest()
+        stale = [name for name, entry in manifest.items()
+                 if name not in sizes or entry.get('version') != self._get_size_version(sizes[name])]
+        for name in stale:
+            self.image.storage.delete(manifest[name].get('path') or
+                                      os.path.join(self.cache_path(), self._get_filename_for_size(name)))
+        if stale:
+            self._update_manifest(dict((name, None) for name in stale))
+        return len(stale)
 
     def pre_cache(self):
         cache = PhotoSizeCache()
-        for photosize in cache.sizes.values():
-            if photosize.pre_cache:
-                self.create_size(photosize)
+        photosizes = [photosize for photosize in cache.sizes.values()
+                      if photosize.pre_cache and not self.size_exists(photosize)]
+        if photosizes:
+            get_queue().enqueue(self, photosizes)
 
-    def save(self, *args, **kwargs):
+    def _set_date_taken(self):
         if self.date_taken is None:
             try:
                 exif_date = self.EXIF.get('EXIF DateTimeOriginal', None)
@@ -621,9 +1587,22 @@ class ImageModel(models.Model):
                 pass
         if self.date_taken is None:
             self.date_taken = now()
-        if self._get_pk_val():
-            self.clear_cache()
-        super(ImageModel, self).save(*args, **kwargs)
+
+    def save(self, *args, **kwargs):
+        # Cached sizes are not deleted here: each one is recorded with the version
+        # it was rendered from, so if the image, crop or effect changed, they are
+        # stale and get created again when needed; otherwise they are still good.
+        # Stale files are removed by sweep_cache().
+        if self.image and not self.image._committed:
+            self.hash_image(self.image)
+        if self._state.adding and not self.cached_sizes:
+            # A new image has no sizes cached under their old names.
+            self.cached_sizes = '{}'
+        self._set_date_taken()
+        # The cached sizes are recorded by _update_manifest(), maybe by a worker,
+        # and the views are added up by ViewCountBuffer.flush(); they are only
+        # saved here if they were changed on this instance.
+        save_excluding(self, super(ImageModel, self).save, ('cached_sizes', 'view_count'), args, kwargs)
         self.pre_cache()
 
     def delete(self):
@@ -660,6 +1639,9 @@ class Photo(ImageModel):
 
     objects = PassThroughManager.for_queryset_class(PhotoQuerySet)()
 
+    # A change of is_public changes the photo counts of the galleries.
+    _tracked_fields = ImageModel._tracked_fields + ('is_public',)
+
     class Meta:
         ordering = ['-date_taken']
         get_latest_by = 'date_taken'
@@ -685,33 +1667,60 @@ class Photo(ImageModel):
         """Find the neighbour of this photo in the supplied gallery.
         We assume that the gallery and all its photos are on the same site.
         """
-        if not self.is_public:
-            raise ValueError('Cannot determine neighbours of a non-public photo.')
-        photos = gallery.photos.is_public()
-        if not self in photos:
-            raise ValueError('Photo does not belong to gallery.')
-        previous = None
-        for photo in photos:
-            if photo == self:
-                return previous
-            previous = photo
+        return self.get_neighbours(gallery)[0]
 
     def get_next_in_gallery(self, gallery):
         """Find the neighbour of this photo in the supplied gallery.
         We assume that the gallery and all its photos are on the same site.
         """
+        return self.get_neighbours(gallery)[1]
+
+    def get_neighbours(self, gallery):
+        """Find the public photos before and after this photo in the supplied
+        gallery, as a (previous, next) tuple; either can be None.
+
+        They are found in a single query, from the position of this photo in
+        the gallery, so the cost does not grow with the size of the gallery.
+        We assume that the gallery and all its photos are on the same site.
+        """
         if not self.is_public:
             raise ValueError('Cannot determine neighbours of a non-public photo.')
-        photos = gallery.photos.is_public()
-        if not self in photos:
+        field = Gallery._meta.get_field('photos')
+        through = field.rel.through
+        gallery_name, photo_name = field.m2m_field_name(), field.m2m_reverse_field_name()
+        sort_name = getattr(through, '_sort_field_name', 'sort_value')
+        qn = connection.ops.quote_name
+        names = {'table': qn(through._meta.db_table),
+                 'gallery': qn(through._meta.get_field(gallery_name).column),
+                 'photo': qn(through._meta.get_field(photo_name).column),
+                 'sort': qn(through._meta.get_field(sort_name).column),
+                 'photo_table': qn(Photo._meta.db_table),
+                 'pk': qn(Photo._meta.pk.column),
+                 'is_public': qn(Photo._meta.get_field('is_public').column)}
+        # The position of this photo, and the closest positions of public photos
+        # on either side of it.
+        position = '(SELECT {sort} FROM {table} WHERE {gallery} = %s AND {photo} = %s)'.format(**names)
+        closest = ('(SELECT {{0}}(t.{sort}) FROM {table} t INNER JOIN {photo_table} p ON t.{photo} = p.{pk} '
+                   'WHERE t.{gallery} = %s AND p.{is_public} = %s AND t.{sort} {{1}} {{2}})').format(**names)
+        where = '{0}.{1} IN ({2}, {3}, {4})'.format(names['table'], names['sort'], position,
+                                                   closest.format('MAX', '<', position),
+                                                   closest.format('MIN', '>', position))
+        position_params = [gallery.pk, self.pk]
+        closest_params = [gallery.pk, True] + position_params
+        rows = list(through.objects.filter(**{gallery_name: gallery})
+                                   .select_related(photo_name)
+                                   .extra(where=[where], params=position_params + closest_params * 2))
+        current = [row for row in rows if getattr(row, photo_name + '_id') == self.pk]
+        if not current:
             raise ValueError('Photo does not belong to gallery.')
-        matched = False
-        for photo in photos:
-            if matched:
-                return photo
-            if photo == self:
-                matched = True
-        return None
+        here = getattr(current[0], sort_name)
+        previous = following = None
+        for row in rows:
+            if getattr(row, sort_name) < here:
+                previous = getattr(row, photo_name)
+            elif getattr(row, sort_name) > here:
+                following = getattr(row, photo_name)
+        return previous, following
 
     @property
     def title_slug(self):
@@ -768,23 +1777,37 @@ class BaseEffect(models.Model):
         im = self.post_process(im)
         return im
 
+    def signature(self):
+        """Return a string that changes whenever the output of this effect
+        would change."""
+        return '|'.join(['%s=%s' % (f.name, force_text(f.value_from_object(self)))
+                         for f in self._meta.fields
+                         if f.name not in ('id', 'name', 'description')])
+
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
+        old = None
+        if self._get_pk_val() is not None:
+            old = self.__class__.objects.filter(pk=self._get_pk_val()).first()
         try:
-            default_storage.delete(self.sample_filename())
+            default_storage.delete((old or self).sample_filename())
         except:
             pass
         models.Model.save(self, *args, **kwargs)
         self.create_sample()
+        # The photo sizes are cached along with their effect and watermark.
+        PhotoSizeCache().reset()
+        if old is not None and old.signature() != self.signature():
+            self.schedule_rendition_jobs()
+
+    def schedule_rendition_jobs(self):
+        """Bring up to date the cached sizes that use this effect: all the photos
+        for the photo sizes with this effect, and all the sizes of the photos with
+        this effect."""
         for size in self.photo_sizes.all():
-            size.clear_cache()
-        # try to clear all related subclasses of ImageModel
-        for prop in [prop for prop in dir(self) if prop[-8:] == '_related']:
-            for obj in getattr(self, prop).all():
-                obj.clear_cache()
-                obj.pre_cache()
+            RenditionJob.schedule(size.name)
 
     def delete(self):
         try:
@@ -792,6 +1815,7 @@ class BaseEffect(models.Model):
         except:
             pass
         models.Model.delete(self)
+        PhotoSizeCache().reset()
 
 
 class PhotoEffect(BaseEffect):
@@ -851,6 +1875,12 @@ class PhotoEffect(BaseEffect):
                     pass
         return im
 
+    def schedule_rendition_jobs(self):
+        # The photos with an effect of their own do not use the one of the size.
+        for size in self.photo_sizes.all():
+            RenditionJob.schedule(size.name, without_effect=True)
+        RenditionJob.schedule(effect=self)
+
     def post_process(self, im):
         if self.reflection_size != 0.0:
             im = add_reflection(im, bgcolor=self.background_color,
@@ -880,8 +1910,21 @@ class Watermark(BaseEffect):
         self.image.storage.delete(self.image.name)
 
     def post_process(self, im):
-        mark = Image.open(self.image.storage.open(self.image.name))
-        return apply_watermark(im, mark, self.style, self.opacity)
+        # The layers are kept for the current version of the watermark only; an
+        # edited watermark gets a new signature.
+        key = (self.pk, self.signature())
+        layer = watermark_layers.get(key + (im.size,)) if self.pk is not None else None
+        if layer is None:
+            mark = watermark_marks.get(key) if self.pk is not None else None
+            if mark is None:
+                mark = Image.open(self.image.storage.open(self.image.name))
+                mark = reduce_opacity(mark, self.opacity) if self.opacity < 1 else mark.convert('RGBA')
+                if self.pk is not None:
+                    watermark_marks.set(key, mark)
+            layer = watermark_region(mark, im.size, self.style)
+            if self.pk is not None:
+                watermark_layers.set(key + (im.size,), layer)
+        return composite_region(im, *layer)
 
 
 @python_2_unicode_compatible
@@ -949,6 +1992,14 @@ class PhotoSize(models.Model):
                     obj.create_size(self)
         PhotoSizeCache().reset()
 
+    def signature(self, effect=True):
+        """Return a string that changes whenever the images rendered for this
+        size would change; leave out the effect for photos that have their own."""
+        parts = [self.width, self.height, self.quality, self.upscale, self.crop]
+        parts.append(self.effect.signature() if effect and self.effect_id else '')
+        parts.append(self.watermark.signature() if self.watermark_id else '')
+        return '|'.join([force_text(part) for part in parts])
+
     def clean(self):
         if self.crop is True:
             if self.width == 0 or self.height == 0:
@@ -956,15 +2007,28 @@ class PhotoSize(models.Model):
                     _("Can only crop photos if both width and height dimensions are set."))
 
     def save(self, *args, **kwargs):
+        old = None
+        if self._get_pk_val() is not None:
+            old = PhotoSize.objects.filter(pk=self._get_pk_val()).first()
         super(PhotoSize, self).save(*args, **kwargs)
         PhotoSizeCache().reset()
-        self.clear_cache()
+        # Only bring the cached sizes up to date if what they look like changed;
+        # the photos themselves are processed by a RenditionJob.
+        if old is not None and old.name != self.name:
+            RenditionJob.schedule(old.name, remove=True)
+            old = None
+        if old is None:
+            if self.pre_cache:
+                RenditionJob.schedule(self.name)
+        elif old.signature() != self.signature() or (self.pre_cache and not old.pre_cache):
+            RenditionJob.schedule(self.name)
 
     def delete(self):
         assert self._get_pk_val() is not None, "%s object can't be deleted because its %s attribute is set to None." % (
             self._meta.object_name, self._meta.pk.attname)
-        self.clear_cache()
         super(PhotoSize, self).delete()
+        PhotoSizeCache().reset()
+        RenditionJob.schedule(self.name, remove=True)
 
     def _get_size(self):
         return (self.width, self.height)
@@ -975,29 +2039,213 @@ class PhotoSize(models.Model):
 
 
 class PhotoSizeCache(object):
-    __state = {"sizes": {}}
+
+    """The photo sizes, by name.
+
+    The sizes are loaded once per process, and shared by all instances (Borg
+    pattern). Changing a size bumps a version stamp in Photologue's cache (see
+    photologue.utils.caching); every process compares its copy with the stamp -
+    at most once every SIZES_CHECK_INTERVAL seconds - and reloads the sizes when
+    it has changed. The sizes themselves are kept in the cache too, so that only
+    the first process to need a new version queries the database.
+    """
+
+    __state = {"sizes": {}, "version": None, "checked": 0}
 
     def __init__(self):
         self.__dict__ = self.__state
-        if not len(self.sizes):
-            sizes = PhotoSize.objects.all()
-            for size in sizes:
-                self.sizes[size.name] = size
+        if self.version is None or time.time() - self.checked >= SIZES_CHECK_INTERVAL:
+            self.checked = time.time()
+            cache = get_cache()
+            version = cache.get(SIZES_VERSION_KEY)
+            if version is None:
+                cache.add(SIZES_VERSION_KEY, uuid.uuid4().hex, None)
+                version = cache.get(SIZES_VERSION_KEY)
+            if version is None or version != self.version:
+                self.sizes = self._load(cache, version)
+                self.version = version
+
+    def _load(self, cache, version):
+        key = SIZES_KEY.format(version)
+        sizes = cache.get(key) if version is not None else None
+        if sizes is None:
+            sizes = list(PhotoSize.objects.select_related('effect', 'watermark'))
+            if version is not None:
+                cache.set(key, sizes, SIZES_CACHE_TIMEOUT)
+        return dict((size.name, size) for size in sizes)
 
     def reset(self):
-        self.sizes = {}
+        """Reload the sizes, in this process and all the others.
 
+        The sizes are stored under the new version before it is announced. The
+        change may not be committed yet, so another process loading the sizes for
+        the new version from the database could get, and cache, the old ones.
+        """
+        cache = get_cache()
+        version = uuid.uuid4().hex
+        sizes = list(PhotoSize.objects.select_related('effect', 'watermark'))
+        cache.set(SIZES_KEY.format(version), sizes, SIZES_CACHE_TIMEOUT)
+        cache.set(SIZES_VERSION_KEY, version, None)
+        self.sizes = dict((size.name, size) for size in sizes)
+        self.version = version
+        self.checked = time.time()
 
-# Set up the accessor methods
-def add_methods(sender, instance, signal, *args, **kwargs):
-    """ Adds methods to access sized images (urls, paths)
 
-    after the Photo model's __init__ function completes,
-    this method calls "add_accessor_methods" on each instance.
+class QueuedSize(models.Model):
+
+    """A cached size waiting to be created, see photologue.queues.DatabaseQueue."""
+
+    content_type = models.ForeignKey(ContentType)
+    object_id = models.PositiveIntegerField()
+    size_name = models.CharField(max_length=40)
+    created = models.DateTimeField(default=now)
+    claimed = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['created']
+        unique_together = (('content_type', 'object_id', 'size_name'),)
+        verbose_name = _('queued size')
+        verbose_name_plural = _('queued sizes')
+
+
+class RenditionJob(models.Model):
+
+    """Bringing the cached sizes of many photos up to date after a change.
+
+    A job covers one photo size (or all of them if ``size_name`` is blank),
+    for all the photos of a model, or only those with ``effect``, or only those
+    without an effect of their own if ``without_effect`` is set. If ``remove``
+    is set, the photo size has been deleted and its cached sizes are removed.
+
+    The photos are processed a batch at a time, in primary key order;
+    ``position`` is the primary key of the last photo processed. The job is
+    deleted once all the photos have been processed.
     """
-    if hasattr(instance, 'add_accessor_methods'):
-        instance.add_accessor_methods()
-post_init.connect(add_methods)
+
+    content_type = models.ForeignKey(ContentType)
+    size_name = models.CharField(max_length=40, blank=True)
+    effect = models.ForeignKey('PhotoEffect', null=True, blank=True)
+    remove = models.BooleanField(default=False)
+    without_effect = models.BooleanField(default=False)
+    position = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(default=now)
+    claimed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created']
+        unique_together = (('content_type', 'size_name', 'effect'),)
+        verbose_name = _('rendition job')
+        verbose_name_plural = _('rendition jobs')
+
+    @classmethod
+    def schedule(cls, size_name='', remove=False, effect=None, without_effect=False):
+        """Create (or restart) the jobs for a photo size or an effect, and hand
+        them to the queue; the queues that come with Photologue leave them for
+        ``plworker``."""
+        for model in ImageModel.__subclasses__():
+            content_type = ContentType.objects.get_for_model(model)
+            job, created = cls.objects.get_or_create(content_type=content_type, size_name=size_name,
+                                                     effect=effect)
+            # A job restarted before it was done keeps covering all the photos.
+            job.without_effect = without_effect and (created or job.without_effect)
+            job.remove = remove
+            job.position = 0
+            job.processed = 0
+            job.total = job.get_queryset().count()
+            job.claimed = None
+            job.save()
+            get_queue().enqueue_job(job)
+
+    def get_queryset(self):
+        """Return the photos the job covers."""
+        model = self.content_type.model_class()
+        if model is None:
+            return None
+        queryset = model._default_manager.all()
+        if self.effect_id is not None:
+            queryset = queryset.filter(effect=self.effect_id)
+        elif self.without_effect:
+            queryset = queryset.filter(effect__isnull=True)
+        return queryset
+
+    def progress(self):
+        if not self.total:
+            return '-'
+        return '{0} / {1} ({2}%)'.format(self.processed, self.total, 100 * self.processed // self.total)
+    progress.short_description = _('progress')
+
+    def claim(self):
+        """Return True if this worker got the job; another one may hold it."""
+        claimed = now()
+        if not RenditionJob.objects.filter(pk=self.pk, claimed=self.claimed).update(claimed=claimed):
+            return False
+        self.claimed = claimed
+        return True
+
+    def run(self, batch_size=100):
+        """Process all the photos."""
+        while self.claim() and self.run_batch(batch_size) == batch_size:
+            pass
+
+    def run_batch(self, batch_size=100):
+        """Process the next batch of photos of a claimed job, and release it.
+
+        Returns the number of photos processed. Progress is not recorded if the
+        job was restarted in the meantime.
+        """
+        sizes = PhotoSizeCache().sizes
+        if not self.size_name:
+            photosizes = list(sizes.values())
+        elif self.size_name in sizes and not self.remove:
+            photosizes = [sizes[self.size_name]]
+        else:
+            photosizes = None
+        queryset = self.get_queryset()
+        objs = []
+        if queryset is not None:
+            objs = list(queryset.filter(pk__gt=self.position).order_by('pk')[:batch_size])
+        for obj in objs:
+            try:
+                if photosizes is None:
+                    obj.remove_size(self.size_name)
+                else:
+                    self._update(obj, photosizes)
+            except Exception:
+                logger.exception('Could not update the cached sizes of {0} #{1}.'.format(
+                    self.content_type, obj.pk))
+        jobs = RenditionJob.objects.filter(pk=self.pk, claimed=self.claimed)
+        if len(objs) < batch_size:
+            jobs.delete()
+        else:
+            self.position = objs[-1].pk
+            self.processed += len(objs)
+            jobs.update(position=self.position, processed=self.processed, claimed=None)
+        self.claimed = None
+        return len(objs)
+
+    def _update(self, obj, photosizes):
+        """Create the stale pre-cached sizes of a photo again, and remove the
+        other stale ones, which are not worth creating until asked for."""
+        manifest = obj._get_manifest()
+        stale = [photosize for photosize in photosizes
+                 if (photosize.pre_cache or photosize.name in manifest) and not obj.size_exists(photosize)]
+        create = [photosize for photosize in stale if photosize.pre_cache]
+        if create:
+            obj.create_sizes(create)
+        for photosize in stale:
+            if not photosize.pre_cache:
+                obj.remove_size(photosize)
+
+
+def add_methods(sender, instance, signal, *args, **kwargs):
+    """Deprecated: the get_SIZE_*() methods of photos are now always available,
+    so this no longer needs connecting to post_init."""
+    warnings.warn(
+        DeprecationWarning('add_methods() is no longer needed, as the get_SIZE_*() methods are '
+                           'always available. It will be removed in Photologue 3.2.'))
 
 
 def add_default_site(instance, created, **kwargs):
@@ -1016,3 +2264,289 @@ def add_default_site(instance, created, **kwargs):
     instance.sites.add(Site.objects.get_current())
 post_save.connect(add_default_site, sender=Gallery)
 post_save.connect(add_default_site, sender=Photo)
+
+
+def get_gallery_photo_ids(galleries, public=True):
+    """
+    Return the ids of the photos in each of the supplied galleries (instances or
+    ids), as a dict keyed by gallery id. Cached lists are fetched from the cache
+    in one go, and the others are worked out with a single query.
+    """
+    cache = get_cache()
+    gallery_ids = [getattr(gallery, 'pk', gallery) for gallery in galleries]
+    version_keys = dict((GALLERY_IDS_VERSION_KEY.format(pk), pk) for pk in gallery_ids)
+    versions = dict((version_keys[key], version) for key, version in cache.get_many(list(version_keys)).items())
+    new_versions = dict((key, uuid.uuid4().hex) for key, pk in version_keys.items() if pk not in versions)
+    if new_versions:
+        cache.set_many(new_versions, None)
+        versions.update((version_keys[key], version) for key, version in new_versions.items())
+    keys = dict((GALLERY_IDS_KEY.format(versions[pk], pk, settings.SITE_ID, int(public)), pk)
+                for pk in gallery_ids)
+    ids = dict((keys[key], value) for key, value in cache.get_many(list(keys)).items())
+    missing = [pk for pk in keys.values() if pk not in ids]
+    if missing:
+        field = Gallery._meta.get_field('photos')
+        through = field.rel.through
+        gallery_field, photo_field = field.m2m_field_name(), field.m2m_reverse_field_name()
+        rows = through.objects.filter(**{gallery_field + '__in': missing,
+                                         photo_field + '__sites__id': settings.SITE_ID})
+        if public:
+            rows = rows.filter(**{photo_field + '__is_public': True})
+        for pk in missing:
+            ids[pk] = []
+        for gallery_id, photo_id in rows.values_list(gallery_field, photo_field):
+            ids[gallery_id].append(photo_id)
+        cache.set_many(dict((key, ids[pk]) for key, pk in keys.items() if pk in missing),
+                       GALLERY_IDS_CACHE_TIMEOUT)
+    return ids
+
+
+def pick_gallery_samples(galleries, count=None, size=None, public=True):
+    """
+    Pick a random sample of photos for each of the supplied galleries, and
+    return the samples as a dict keyed by gallery id. All the photos are loaded
+    with a single query; if the name of a photo size is given, the urls of that
+    size are worked out for them as well.
+    """
+    if not count:
+        count = SAMPLE_SIZE
+    ids = get_gallery_photo_ids(galleries, public)
+    chosen = {}
+    for gallery in galleries:
+        gallery_ids = ids[gallery.pk]
+        chosen[gallery.pk] = random.sample(gallery_ids, min(count, len(gallery_ids)))
+    photos = Photo.objects.all()
+    if size is not None and size in PhotoSizeCache().sizes:
+        photos = photos.with_rendition_urls(size)
+    all_chosen = [pk for gallery_chosen in chosen.values() for pk in gallery_chosen]
+    photos = photos.in_bulk(all_chosen) if all_chosen else {}
+    # Photos that were deleted since the list was cached are left out.
+    return dict((pk, [photos[photo_pk] for photo_pk in gallery_chosen if photo_pk in photos])
+                for pk, gallery_chosen in chosen.items())
+
+
+def set_gallery_samples(galleries, count=None, size=None, public=True):
+    """
+    Store a random sample of photos as the ``samples`` attribute of each of the
+    supplied galleries; see pick_gallery_samples().
+    """
+    samples = pick_gallery_samples(galleries, count, size, public)
+    for gallery in galleries:
+        gallery.samples = samples[gallery.pk]
+
+
+def get_random_photo(gallery, size):
+    """
+    Pick a public photo at random from a gallery - an instance, or its slug -
+    and return a dict with its 'pk', its 'title' and the 'url' of the named
+    photo size; or None if there is no such gallery, or it has no public photos.
+
+    The photo is picked from the cached list of the ids of the photos in the
+    gallery, and its url is kept in Photologue's cache once its cached size
+    exists, so most of the time this queries neither the database nor the storage.
+    """
+    photosize = PhotoSizeCache().sizes.get(size)
+    if photosize is None:
+        raise ValueError('Unknown photo size "{0}".'.format(size))
+    cache = get_cache()
+    if isinstance(gallery, Gallery):
+        gallery_id = gallery.pk
+    else:
+        key = GALLERY_SLUG_KEY.format(gallery)
+        gallery_id = cache.get(key)
+        if gallery_id is None:
+            try:
+                gallery_id = Gallery.objects.values_list('pk', flat=True).get(slug=gallery)
+            except Gallery.DoesNotExist:
+                return None
+            cache.set(key, gallery_id, GALLERY_IDS_CACHE_TIMEOUT)
+
+    ids = get_gallery_photo_ids([gallery_id])[gallery_id]
+    if not ids:
+        return None
+    photo_id = random.choice(ids)
+
+    sizes_version = cache.get(SIZES_VERSION_KEY)
+    key = RENDITION_KEY.format(sizes_version, Photo._meta.model_name, photo_id, photosize.name)
+    rendition = cache.get(key) if sizes_version is not None else None
+    if rendition is not None:
+        if photosize.increment_count:
+            ViewCountBuffer().add(Photo(pk=photo_id))
+        return rendition
+    photo = Photo.objects.in_bulk([photo_id]).get(photo_id)
+    if photo is None:
+        # Deleted since the list of ids was cached.
+        return None
+    rendition = {'pk': photo.pk,
+                 'title': photo.title,
+                 'url': getattr(photo, 'get_{0}_url'.format(photosize.name))()}
+    # With a background queue, the cached size may not have been created yet.
+    if sizes_version is not None and photo.size_exists(photosize):
+        cache.set(key, rendition, GALLERY_IDS_CACHE_TIMEOUT)
+    return rendition
+
+
+def forget_renditions(obj, names=None):
+    """Drop the cached urls of the named sizes of an image (all the sizes, if
+    None), see get_random_photo()."""
+    cache = get_cache()
+    sizes_version = cache.get(SIZES_VERSION_KEY)
+    if sizes_version is None:
+        return
+    if names is None:
+        names = PhotoSizeCache().sizes.keys()
+    keys = [RENDITION_KEY.format(sizes_version, obj._meta.model_name, obj._get_pk_val(), name)
+            for name in names]
+    if keys:
+        cache.delete_many(keys)
+
+
+def photo_changed(instance, **kwargs):
+    """Called via Django's signals when a photo is saved or deleted: its title,
+    or the image itself, may have changed."""
+    forget_renditions(instance)
+post_save.connect(photo_changed, sender=Photo)
+post_delete.connect(photo_changed, sender=Photo)
+
+
+def forget_gallery_photo_ids(galleries):
+    """Drop the cached lists of the ids of the photos in the supplied galleries
+    (instances or ids); the other galleries keep theirs."""
+    keys = [GALLERY_IDS_VERSION_KEY.format(getattr(gallery, 'pk', gallery)) for gallery in galleries]
+    if keys:
+        get_cache().delete_many(keys)
+
+
+def galleries_changed(galleries):
+    """Photos have been added to or removed from the supplied galleries
+    (instances or ids), or made public or private: bring their cached ids and
+    their photo counts up to date."""
+    galleries = list(galleries)
+    forget_gallery_photo_ids(galleries)
+    update_gallery_photo_counts(galleries)
+
+
+def gallery_saved(instance, **kwargs):
+    """Called via Django's signals when a gallery is saved or deleted: forget
+    the gallery its slug, or its old slug, pointed to."""
+    slugs = set([instance.slug, instance.__dict__.get('_loaded_values', {}).get('slug')])
+    get_cache().delete_many([GALLERY_SLUG_KEY.format(slug) for slug in slugs if slug])
+    remember_loaded_values(instance)
+post_save.connect(gallery_saved, sender=Gallery)
+post_delete.connect(gallery_saved, sender=Gallery)
+
+
+def update_gallery_photo_counts(galleries=None):
+    """
+    Count the photos in the supplied galleries - instances or ids, or all the
+    galleries if None - and store the counts in their 'photo_counts' field. The
+    photos of all the galleries are counted with a single query.
+    """
+    field = Gallery._meta.get_field('photos')
+    through = field.rel.through
+    gallery_field, photo_field = field.m2m_field_name(), field.m2m_reverse_field_name()
+    rows = through.objects.all()
+    instances = {}
+    if galleries is None:
+        ids = set(Gallery.objects.values_list('pk', flat=True))
+    else:
+        ids = set()
+        for gallery in galleries:
+            if isinstance(gallery, Gallery):
+                instances.setdefault(gallery.pk, []).append(gallery)
+                gallery = gallery.pk
+            ids.add(gallery)
+        if not ids:
+            return
+        rows = rows.filter(**{gallery_field + '__in': ids})
+    # {gallery id: {site id: [public count, total count]}}
+    counts = dict((pk, {}) for pk in ids)
+    rows = rows.values(gallery_field, photo_field + '__sites__id', photo_field + '__is_public') \
+               .annotate(count=models.Count(photo_field)) \
+               .order_by()
+    for row in rows:
+        site_id = row[photo_field + '__sites__id']
+        if site_id is None:
+            continue
+        site_counts = counts[row[gallery_field]].setdefault(str(site_id), [0, 0])
+        if row[photo_field + '__is_public']:
+            site_counts[0] += row['count']
+        site_counts[1] += row['count']
+    values = dict((pk, json.dumps(gallery_counts, sort_keys=True)) for pk, gallery_counts in counts.items())
+    for pk, value in values.items():
+        for gallery in instances.get(pk, ()):
+            gallery.photo_counts = value
+            gallery._loaded_values['photo_counts'] = value
+    # Write all the counts with one UPDATE per batch of galleries.
+    db = router.db_for_write(Gallery)
+    qn = connections[db].ops.quote_name
+    sql = 'UPDATE {0} SET {1} = CASE {2} {{0}} END WHERE {2} IN ({{1}})'.format(
+        qn(Gallery._meta.db_table), qn(Gallery._meta.get_field('photo_counts').column), qn(Gallery._meta.pk.column))
+    pks = sorted(values)
+    with transaction.atomic(using=db):
+        cursor = connections[db].cursor()
+        for i in range(0, len(pks), COUNT_UPDATE_BATCH_SIZE):
+            batch = pks[i:i + COUNT_UPDATE_BATCH_SIZE]
+            params = []
+            for pk in batch:
+                params.extend([pk, values[pk]])
+            cursor.execute(sql.format(' '.join(['WHEN %s THEN %s'] * len(batch)), ', '.join(['%s'] * len(batch))),
+                           params + batch)
+
+
+def photo_saved(instance, created, **kwargs):
+    """Called via Django's signals: bring the galleries a photo is in up to date
+    if it has been made public or private."""
+    loaded = instance.__dict__.get('_loaded_values', {})
+    if not created and loaded.get('is_public', not instance.is_public) != instance.is_public:
+        galleries_changed(instance.galleries.values_list('pk', flat=True))
+post_save.connect(photo_saved, sender=Photo)
+
+
+def photo_deleting(instance, **kwargs):
+    """Called via Django's signals: the links between a photo and its galleries
+    are gone by the time it has been deleted, so note them beforehand."""
+    instance._count_gallery_ids = list(instance.galleries.values_list('pk', flat=True))
+pre_delete.connect(photo_deleting, sender=Photo)
+
+
+def photo_deleted(instance, **kwargs):
+    galleries_changed(instance.__dict__.pop('_count_gallery_ids', ()))
+post_delete.connect(photo_deleted, sender=Photo)
+
+
+def gallery_photos_changed(instance, action, reverse, pk_set, **kwargs):
+    """Called via Django's signals: bring up to date the galleries that photos
+    have been added to or removed from."""
+    if reverse and action == 'pre_clear':
+        instance._count_gallery_ids = list(instance.galleries.values_list('pk', flat=True))
+    elif not reverse and action.startswith('post_'):
+        galleries_changed([instance])
+    elif action == 'post_clear':
+        galleries_changed(instance.__dict__.pop('_count_gallery_ids', ()))
+    elif action in ('post_add', 'post_remove'):
+        galleries_changed(pk_set)
+m2m_changed.connect(gallery_photos_changed, sender=Gallery._meta.get_field('photos').rel.through)
+
+
+def photo_sites_changed(instance, action, reverse, pk_set, **kwargs):
+    """Called via Django's signals: bring up to date the galleries of photos
+    that have been added to or removed from sites."""
+    if action == 'pre_clear':
+        galleries = Gallery.objects.filter(photos__sites=instance) if reverse else instance.galleries.all()
+        instance._count_gallery_ids = list(galleries.values_list('pk', flat=True).distinct())
+    elif action == 'post_clear':
+        galleries_changed(instance.__dict__.pop('_count_gallery_ids', ()))
+    elif action in ('post_add', 'post_remove'):
+        if reverse:
+            galleries = Gallery.objects.filter(photos__in=pk_set)
+        else:
+            galleries = instance.galleries.all()
+        galleries_changed(galleries.values_list('pk', flat=True).distinct())
+m2m_changed.connect(photo_sites_changed, sender=Photo.sites.through)
+
+
+def delete_chunk_file(instance, **kwargs):
+    """Remove the file of an upload chunk along with it."""
+    instance.file.delete(save=False)
+post_delete.connect(delete_chunk_file, sender=UploadChunk)
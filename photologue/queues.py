@@ -0,0 +1,219 @@
+"""
+Queues decide when the cached sizes of an image get generated.
+
+By default a missing size is generated straight away, inside the request that
+first asks for its url. This is simple, but a page full of new photos can block
+a web worker for a long time.
+
+Set ``PHOTOLOGUE_QUEUE`` to the dotted path of another queue class to move that
+work elsewhere: the url accessors then return at once, and the size is generated
+in the background. Photologue ships with ``DatabaseQueue``, which stores the
+work in a database table for the ``plworker`` management command to process.
+"""
+import atexit
+import logging
+import threading
+from datetime import timedelta
+try:
+    from importlib import import_module
+except ImportError:
+    # Compatibility with Python 2.6.
+    from django.utils.importlib import import_module
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.signals import request_finished
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils.timezone import now
+
+logger = logging.getLogger('photologue.queues')
+
+QUEUE = getattr(settings, 'PHOTOLOGUE_QUEUE', 'photologue.queues.SynchronousQueue')
+
+# The number of sizes that DatabaseQueue writes at once, and the number it
+# remembers having queued.
+DATABASE_QUEUE_BATCH_SIZE = 100
+DATABASE_QUEUE_MEMORY = 10000
+
+_queues = {}
+
+
+def get_queue():
+    """Return the queue configured with ``PHOTOLOGUE_QUEUE``."""
+    if QUEUE not in _queues:
+        module_name, class_name = QUEUE.rsplit('.', 1)
+        _queues[QUEUE] = getattr(import_module(module_name), class_name)()
+    return _queues[QUEUE]
+
+
+class BaseQueue(object):
+
+    """Subclasses must implement enqueue()."""
+
+    def enqueue(self, obj, photosizes):
+        """Arrange for the supplied sizes of an ImageModel instance to be
+        created."""
+        raise NotImplementedError
+
+    def enqueue_job(self, job):
+        """Arrange for a RenditionJob to be run. By default it is left in the
+        database for ``plworker``."""
+        pass
+
+    def flush(self):
+        """Write out any work held back by enqueue(); called at the end of each
+        request and when the process exits."""
+        pass
+
+
+class SynchronousQueue(BaseQueue):
+
+    """Create the sizes straight away. This is the default, and is also the
+    one to use in tests.
+
+    Rendition jobs are left for ``plworker`` all the same: meanwhile, the stale
+    sizes of the photos that get displayed are created when asked for."""
+
+    def enqueue(self, obj, photosizes):
+        obj.create_sizes(photosizes)
+
+
+class DatabaseQueue(BaseQueue):
+
+    """Store the sizes to create in the database; they get created by the
+    ``plworker`` management command.
+
+    The sizes are written in batches, at the end of the request or once enough
+    of them are waiting. Sizes queued by this process are remembered, so asking
+    again for the url of a missing size does not query the database."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = []
+        self.queued = set()
+
+    def enqueue(self, obj, photosizes):
+        from django.contrib.contenttypes.models import ContentType
+        content_type = ContentType.objects.get_for_model(obj)
+        with self.lock:
+            for photosize in photosizes:
+                # A new version of a size has to be queued again, even if the
+                # previous one was.
+                key = (content_type.pk, obj.pk, photosize.name, obj._get_size_version(photosize))
+                if key not in self.queued:
+                    self.queued.add(key)
+                    self.pending.append(key)
+            due = len(self.pending) >= DATABASE_QUEUE_BATCH_SIZE
+        if due:
+            self.flush()
+
+    def flush(self):
+        from .models import QueuedSize
+        with self.lock:
+            pending, self.pending = self.pending, []
+            if len(self.queued) > DATABASE_QUEUE_MEMORY:
+                self.queued = set(pending)
+        if not pending:
+            return
+        try:
+            sizes = set((content_type_id, object_id, size_name)
+                        for content_type_id, object_id, size_name, version in pending)
+            existing = QueuedSize.objects.filter(object_id__in=set(size[1] for size in sizes)) \
+                                         .values_list('content_type', 'object_id', 'size_name')
+            tasks = [QueuedSize(content_type_id=content_type_id, object_id=object_id, size_name=size_name)
+                     for content_type_id, object_id, size_name in sizes.difference(existing)]
+            try:
+                with transaction.atomic():
+                    QueuedSize.objects.bulk_create(tasks)
+            except IntegrityError:
+                # Another process queued some of the same sizes meanwhile.
+                for task in tasks:
+                    QueuedSize.objects.get_or_create(content_type_id=task.content_type_id,
+                                                     object_id=task.object_id,
+                                                     size_name=task.size_name)
+        except Exception:
+            # Let the sizes be queued again the next time they are asked for.
+            with self.lock:
+                self.queued.difference_update(pending)
+            raise
+
+
+def process_queue(batch_size=100, claim_timeout=600, max_attempts=3):
+    """Create a batch of the sizes stored by DatabaseQueue.
+
+    Several workers can run at the same time: each size is claimed before it is
+    processed. A claim older than ``claim_timeout`` seconds is assumed to
+    belong to a worker that died, and the size is handed out again. Returns the
+    number of sizes processed.
+    """
+    from .models import QueuedSize, PhotoSizeCache
+    cutoff = now() - timedelta(seconds=claim_timeout)
+    tasks = QueuedSize.objects.filter(Q(claimed__isnull=True) | Q(claimed__lt=cutoff))
+    # Claim a batch, grouping the sizes by image so that each image only gets
+    # decoded once.
+    claimed = {}
+    for task in tasks.select_related('content_type')[:batch_size]:
+        if not QueuedSize.objects.filter(pk=task.pk, claimed=task.claimed) \
+                                 .update(claimed=now(), attempts=F('attempts') + 1):
+            # Another worker got there first.
+            continue
+        claimed.setdefault((task.content_type_id, task.object_id), []).append(task)
+    processed = 0
+    for group in claimed.values():
+        content_type, object_id = group[0].content_type, group[0].object_id
+        try:
+            obj = content_type.get_object_for_this_type(pk=object_id)
+        except ObjectDoesNotExist:
+            obj = None
+        photosizes = []
+        for task in group:
+            photosize = PhotoSizeCache().sizes.get(task.size_name)
+            if obj is None or photosize is None:
+                logger.debug('Discarding queued size "{0}" of {1} #{2}, which no longer exists.'.format(
+                    task.size_name, content_type, object_id))
+                task.delete()
+            else:
+                photosizes.append((task, photosize))
+        if not photosizes:
+            continue
+        try:
+            obj.create_sizes([photosize for task, photosize in photosizes])
+        except Exception:
+            logger.exception('Could not create sizes of {0} #{1}.'.format(content_type, object_id))
+            for task, photosize in photosizes:
+                if task.attempts + 1 >= max_attempts:
+                    task.delete()
+            continue
+        for task, photosize in photosizes:
+            task.delete()
+            processed += 1
+    return processed
+
+
+def process_rendition_jobs(batch_size=100, claim_timeout=600):
+    """Process a batch of photos of each pending RenditionJob.
+
+    As with process_queue(), several workers can run at the same time. Returns
+    the number of photos processed.
+    """
+    from .models import RenditionJob
+    cutoff = now() - timedelta(seconds=claim_timeout)
+    processed = 0
+    for job in RenditionJob.objects.filter(Q(claimed__isnull=True) | Q(claimed__lt=cutoff)) \
+                                   .select_related('content_type'):
+        if job.claim():
+            processed += job.run_batch(batch_size)
+    return processed
+
+
+def flush_queue(**kwargs):
+    """Called via Django's signals at the end of each request, and when the
+    process exits."""
+    if QUEUE in _queues:
+        try:
+            _queues[QUEUE].flush()
+        except Exception:
+            logger.exception('Could not write the queued sizes.')
+request_finished.connect(flush_queue)
+atexit.register(flush_queue)
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent when an image is over the PHOTOLOGUE_MAX_PIXELS limit. ``outcome`` is
+# either 'reduced' (it was decoded at a reduced scale) or 'rejected' (it was not
+# processed at all). Connect to this to feed your metrics.
+image_oversized = Signal(providing_args=['instance', 'outcome'])
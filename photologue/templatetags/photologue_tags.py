@@ -1,20 +1,28 @@
-import random
 from django import template
 
 register = template.Library()
 
 from ..models import Gallery
 from ..models import Photo
+from ..models import PhotoSizeCache, get_random_photo
+
+
+def get_neighbours(photo, gallery):
+    """The neighbours of a photo in a gallery, looked up once for both tags."""
+    neighbours = photo.__dict__.setdefault('_gallery_neighbours', {})
+    if gallery.pk not in neighbours:
+        neighbours[gallery.pk] = photo.get_neighbours(gallery)
+    return neighbours[gallery.pk]
 
 
 @register.inclusion_tag('photologue/tags/next_in_gallery.html')
 def next_in_gallery(photo, gallery):
-    return {'photo': photo.get_next_in_gallery(gallery)}
+    return {'photo': get_neighbours(photo, gallery)[1]}
 
 
 @register.inclusion_tag('photologue/tags/prev_in_gallery.html')
 def previous_in_gallery(photo, gallery):
-    return {'photo': photo.get_previous_in_gallery(gallery)}
+    return {'photo': get_neighbours(photo, gallery)[0]}
 
 
 @register.simple_tag
@@ -107,23 +115,9 @@ class PhotoGalleryNode(template.Node):
             a = template.resolve_variable(self.gallery, context)
         except:
             a = self.gallery
-        if isinstance(a, Gallery):
-            g = a
-        else:
-            try:
-                g = Gallery.objects.get(slug=a)
-            except Gallery.DoesNotExist:
-                return None
-        photos = g.public()
-        if len(photos) > 1:
-            r = random.randint(0, len(photos) - 1)
-            p = photos[r]
-        elif len(photos) == 1:
-            p = photos[0]
-        else:
-            return None
-        func = getattr(p, 'get_%s_url' % (self.photosize), None)
-        if func is None:
+        if self.photosize not in PhotoSizeCache().sizes:
             return 'A "%s" photo size has not been defined.' % (self.photosize)
-        else:
-            return u'<img class="%s" src="%s" alt="%s" />' % (self.css_class, func(), p.title)
+        p = get_random_photo(a, self.photosize)
+        if p is None:
+            return None
+        return u'<img class="%s" src="%s" alt="%s" />' % (self.css_class, p['url'], p['title'])
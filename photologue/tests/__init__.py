@@ -1,9 +1,12 @@
+from photologue.tests.test_commands import *
 from photologue.tests.test_effect import *
 from photologue.tests.test_gallery import *
 from photologue.tests.test_photo import *
 from photologue.tests.test_photosize import *
+from photologue.tests.test_queue import *
 from photologue.tests.test_resize import *
 from photologue.tests.test_views_photo import *
 from photologue.tests.test_views_gallery import *
 from photologue.tests.test_sitemap import *
+from photologue.tests.test_upload import *
 from photologue.tests.test_zipupload import *
@@ -0,0 +1,60 @@
+import os
+import json
+import shutil
+import tempfile
+
+from ..management.commands.plcache import create_cache
+from ..models import Photo
+from .factories import PhotoFactory
+from .helpers import PhotologueBaseTest
+
+
+class PlcacheTest(PhotologueBaseTest):
+
+    def setUp(self):
+        super(PlcacheTest, self).setUp()
+        self.pl2 = PhotoFactory()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(self.tmp_dir, 'plcache.json')
+
+    def tearDown(self):
+        super(PlcacheTest, self).tearDown()
+        self.pl2.delete()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_cache(self):
+        create_cache(['testPhotoSize'], {'chunk_size': 1})
+        for photo in Photo.objects.all():
+            self.assertTrue(photo.size_exists(self.s))
+
+    def test_resume(self):
+        """Chunks recorded in the checkpoint are skipped."""
+        first, second = sorted([self.pl.pk, self.pl2.pk])
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'sizes': ['testPhotoSize'],
+                       'reset': False,
+                       'chunk_size': 1,
+                       'done': ['photologue.Photo:{0}-{0}'.format(first)]}, f)
+        create_cache(['testPhotoSize'], {'chunk_size': 1, 'checkpoint': self.checkpoint})
+        self.assertFalse(Photo.objects.get(pk=first).size_exists(self.s))
+        self.assertTrue(Photo.objects.get(pk=second).size_exists(self.s))
+        # A completed run removes its checkpoint.
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resume_fixed_ranges(self):
+        """Chunks cover fixed ranges of primary keys, whatever other photos
+        there are."""
+        start = (max(self.pl.pk, self.pl2.pk) // 10 + 1) * 10
+        pl3 = PhotoFactory(id=start + 5)
+        try:
+            with open(self.checkpoint, 'w') as f:
+                json.dump({'sizes': ['testPhotoSize'],
+                           'reset': False,
+                           'chunk_size': 10,
+                           'done': ['photologue.Photo:{0}-{1}'.format(start, start + 9)]}, f)
+            create_cache(['testPhotoSize'], {'chunk_size': 10, 'checkpoint': self.checkpoint})
+            self.assertFalse(Photo.objects.get(pk=pl3.pk).size_exists(self.s))
+            self.assertTrue(Photo.objects.get(pk=self.pl.pk).size_exists(self.s))
+            self.assertTrue(Photo.objects.get(pk=self.pl2.pk).size_exists(self.s))
+        finally:
+            pl3.delete()
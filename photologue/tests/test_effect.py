@@ -1,4 +1,8 @@
-from ..models import Image, PhotoEffect
+from django.core.files import File
+
+from .. import queues
+from ..models import Image, Photo, PhotoEffect, PhotoSizeCache, RenditionJob, Watermark
+from .factories import SQUARE_IMAGE_PATH
 from .helpers import PhotologueBaseTest
 
 
@@ -10,3 +14,119 @@ class PhotoEffectTest(PhotologueBaseTest):
         self.assertIsInstance(effect.pre_process(im), Image.Image)
         self.assertIsInstance(effect.post_process(im), Image.Image)
         self.assertIsInstance(effect.process(im), Image.Image)
+
+    def test_reflection(self):
+        effect = PhotoEffect(name='test', reflection_size=0.5, background_color='#FF0000')
+        im = Image.open(self.pl.image.storage.open(self.pl.image.name))
+        width, height = im.size
+        reflected = effect.post_process(im)
+        self.assertEqual(reflected.size, (width, height + height // 2))
+        # The reflection fades into the background color.
+        red, green, blue = reflected.getpixel((0, height + height // 2 - 1))
+        self.assertTrue(red > 250 and green < 5 and blue < 5)
+
+
+class PhotoEffectChangeTest(PhotologueBaseTest):
+
+    def setUp(self):
+        super(PhotoEffectChangeTest, self).setUp()
+        self.effect = PhotoEffect.objects.create(name='test')
+        self.pl.effect = self.effect
+        self.pl.save()
+        self.pl.create_size(self.s)
+        self._current_queue = queues.QUEUE
+        queues.QUEUE = 'photologue.queues.DatabaseQueue'
+
+    def tearDown(self):
+        queues.QUEUE = self._current_queue
+        super(PhotoEffectChangeTest, self).tearDown()
+
+    def test_change_not_affecting_output(self):
+        self.effect.description = 'A new description'
+        self.effect.save()
+        self.assertFalse(RenditionJob.objects.exists())
+        self.assertTrue(Photo.objects.get(pk=self.pl.pk).size_exists(self.s))
+
+    def test_change_affecting_output(self):
+        """Only the photos with the effect are processed, in the background."""
+        self.s.pre_cache = True
+        self.s.save()
+        RenditionJob.objects.all().delete()
+        filename = self.pl.get_testPhotoSize_filename()
+
+        self.effect.brightness = 0.5
+        self.effect.save()
+        job = RenditionJob.objects.get()
+        self.assertEqual((job.effect, job.total, job.progress()), (self.effect, 1, '0 / 1 (0%)'))
+        self.assertFalse(Photo.objects.get(pk=self.pl.pk).size_exists(self.s))
+
+        self.assertEqual(queues.process_rendition_jobs(), 1)
+        self.assertFalse(RenditionJob.objects.exists())
+        self.assertTrue(Photo.objects.get(pk=self.pl.pk).size_exists(self.s))
+        self.assertTrue(self.pl.image.storage.exists(filename))
+
+    def test_size_effect_change(self):
+        """Changing the effect of a photo size changes the version of the cached
+        sizes rendered with it."""
+        size_effect = PhotoEffect.objects.create(name='size effect')
+        self.s.effect = size_effect
+        self.s.save()
+        RenditionJob.objects.all().delete()
+        self.pl.create_size(self.s)
+        version = self.pl._get_size_version(PhotoSizeCache().sizes['testPhotoSize'])
+
+        size_effect.contrast = 0.5
+        size_effect.save()
+        self.assertNotEqual(self.pl._get_size_version(PhotoSizeCache().sizes['testPhotoSize']), version)
+        self.assertTrue(RenditionJob.objects.filter(size_name='testPhotoSize').exists())
+        self.assertFalse(Photo.objects.get(pk=self.pl.pk).size_exists(self.s))
+
+        queues.process_rendition_jobs()
+        self.assertTrue(Photo.objects.get(pk=self.pl.pk).size_exists(PhotoSizeCache().sizes['testPhotoSize']))
+
+    def test_size_effect_change_own_effect(self):
+        """The photos with an effect of their own are left out of the jobs for
+        the effect of a photo size."""
+        size_effect = PhotoEffect.objects.create(name='size effect')
+        self.s.effect = size_effect
+        self.s.save()
+        RenditionJob.objects.all().delete()
+        self.pl.create_size(self.s)
+        version = self.pl._get_size_version(PhotoSizeCache().sizes['testPhotoSize'])
+
+        size_effect.contrast = 0.5
+        size_effect.save()
+        self.assertEqual(self.pl._get_size_version(PhotoSizeCache().sizes['testPhotoSize']), version)
+        job = RenditionJob.objects.get(size_name='testPhotoSize', content_type__model='photo')
+        self.assertTrue(job.without_effect)
+        self.assertEqual(job.total, 0)
+        self.assertTrue(Photo.objects.get(pk=self.pl.pk).size_exists(self.s))
+
+
+class WatermarkTest(PhotologueBaseTest):
+
+    def setUp(self):
+        super(WatermarkTest, self).setUp()
+        self.watermark = Watermark(name='test', style='tile', opacity=0.5)
+        with open(SQUARE_IMAGE_PATH, 'rb') as f:
+            self.watermark.image.save('test_watermark.jpg', File(f))
+
+    def tearDown(self):
+        self.watermark.delete()
+        super(WatermarkTest, self).tearDown()
+
+    def test_layers_reused(self):
+        """The watermark is only read once for images of the same size."""
+        im = Image.open(self.pl.image.storage.open(self.pl.image.name))
+        first = self.watermark.post_process(im)
+        self.watermark.image.storage.delete(self.watermark.image.name)
+        second = self.watermark.post_process(im)
+        self.assertEqual(first.tobytes(), second.tobytes())
+
+    def test_opaque_image(self):
+        """Images without transparency are not converted to RGBA."""
+        for style in ('tile', 'scale'):
+            self.watermark.style = style
+            im = Image.open(self.pl.image.storage.open(self.pl.image.name))
+            self.assertEqual(self.watermark.post_process(im).mode, 'RGB')
+            self.assertEqual(self.watermark.post_process(im.convert('RGBA')).mode, 'RGBA')
@@ -1,3 +1,5 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from .. import models
 from .helpers import PhotologueBaseTest
 from .factories import GalleryFactory, PhotoFactory
@@ -30,11 +32,57 @@ class GalleryTest(PhotologueBaseTest):
         self.assertEqual(self.test_gallery.photo_count(), 2)
         self.pl.is_public = False
         self.pl.save()
+        # The counts are stored in the gallery, so a gallery loaded before the
+        # change still has the old ones; fetching it again gets the new ones.
+        self.assertEqual(self.test_gallery.photo_count(), 2)
+        self.test_gallery = models.Gallery.objects.get(pk=self.test_gallery.pk)
         self.assertEqual(self.test_gallery.photo_count(), 1)
 
         # Method takes an optional 'public' kwarg.
         self.assertEqual(self.test_gallery.photo_count(public=False), 2)
 
+    def test_photo_count_unchanged(self):
+        """Saving a photo only recounts its galleries if it was made public or
+        private."""
+        self.pl.title = 'A new title'
+        with CaptureQueriesContext(connection) as queries:
+            self.pl.save()
+        self.assertFalse([query for query in queries.captured_queries if 'photo_counts' in query['sql']])
+
+    def test_photo_count_kept(self):
+        """The stored counts follow the photos of the gallery, and reading
+        them does not query the database."""
+        def count(public=True):
+            gallery = models.Gallery.objects.get(pk=self.test_gallery.pk)
+            with self.assertNumQueries(0):
+                return gallery.photo_count(public)
+
+        self.assertEqual(count(), 2)
+        pl3 = PhotoFactory()
+        self.test_gallery.photos.add(pl3)
+        self.assertEqual(count(), 3)
+        pl3.galleries.remove(self.test_gallery)
+        self.assertEqual(count(), 2)
+        self.test_gallery.photos.add(pl3)
+        pl3.sites.clear()
+        self.assertEqual((count(), count(public=False)), (2, 2))
+        pl3.delete()
+        self.pl2.galleries.clear()
+        self.assertEqual(count(), 1)
+
+        # Saving a gallery loaded before the counts changed keeps them.
+        gallery = models.Gallery.objects.get(pk=self.test_gallery.pk)
+        self.pl2.galleries.add(self.test_gallery)
+        gallery.description = 'A new description'
+        gallery.save()
+        self.assertEqual(count(), 2)
+        self.pl2.galleries.clear()
+
+        # Counts that are out of step can be repaired.
+        models.Gallery.objects.update(photo_counts='{}')
+        models.update_gallery_photo_counts()
+        self.assertEqual(count(), 1)
+
     def test_sample(self):
         """Method 'sample' should return a random queryset of photos from the 
         gallery."""
@@ -61,3 +109,74 @@ class GalleryTest(PhotologueBaseTest):
         self.assertEqual(len(self.test_gallery.sample()), 1)
 
         models.SAMPLE_SIZE = _current_sample_size
+
+    def test_sample_cached(self):
+        """Once the ids of the photos are cached, only the chosen photos are
+        loaded; the ids are picked up again when the gallery changes."""
+        self.test_gallery.sample()
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.test_gallery.sample(count=1)), 1)
+
+        # Changes to other galleries, or to photos that do not affect the
+        # list, keep it.
+        gallery2 = GalleryFactory()
+        gallery2.photos.add(self.pl)
+        self.pl.title = 'A new title'
+        self.pl.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.test_gallery.sample(count=1)), 1)
+        gallery2.delete()
+
+        pl3 = PhotoFactory()
+        self.test_gallery.photos.add(pl3)
+        self.assertEqual(len(self.test_gallery.sample(count=5)), 3)
+        pl3.delete()
+        self.assertEqual(len(self.test_gallery.sample(count=5)), 2)
+
+    def test_random_photo(self):
+        """A random photo is picked, and its url worked out, from the cache."""
+        self.test_gallery.photos.remove(self.pl2)
+        photo = models.get_random_photo(self.test_gallery.slug, 'testPhotoSize')
+        self.assertEqual(photo['url'], self.pl.get_testPhotoSize_url())
+        with self.assertNumQueries(0):
+            self.assertEqual(models.get_random_photo(self.test_gallery.slug, 'testPhotoSize'), photo)
+
+        # Removing the cached size drops the cached url, so that the size gets created again.
+        self.pl.clear_cache()
+        self.assertEqual(models.get_random_photo(self.test_gallery.slug, 'testPhotoSize'), photo)
+        self.assertTrue(models.Photo.objects.get(pk=self.pl.pk).size_exists(self.s))
+
+        # So does a change to the photo.
+        self.pl.title = 'New title'
+        self.pl.save()
+        self.assertEqual(models.get_random_photo(self.test_gallery.slug, 'testPhotoSize')['title'], 'New title')
+
+        # Renaming the gallery forgets its old slug.
+        slug = self.test_gallery.slug
+        self.test_gallery.slug = 'renamed'
+        self.test_gallery.save()
+        self.assertEqual(models.get_random_photo(slug, 'testPhotoSize'), None)
+        self.assertEqual(models.get_random_photo('renamed', 'testPhotoSize')['pk'], self.pl.pk)
+
+        self.pl.is_public = False
+        self.pl.save()
+        self.assertEqual(models.get_random_photo(self.test_gallery, 'testPhotoSize'), None)
+        self.assertEqual(models.get_random_photo('no-such-gallery', 'testPhotoSize'), None)
+        self.assertRaises(ValueError, models.get_random_photo, self.test_gallery, 'no-such-size')
+
+    def test_with_samples(self):
+        """The samples of a list of galleries are picked with a fixed number of
+        queries."""
+        gallery2 = GalleryFactory()
+        gallery2.photos.add(self.pl)
+        with self.assertNumQueries(3):
+            galleries = list(models.Gallery.objects.filter(pk__in=[self.test_gallery.pk, gallery2.pk])
+                                                   .with_samples())
+            self.assertEqual(sorted([len(gallery.sample()) for gallery in galleries]), [1, 2])
+
+        # Asking for a different count does not replace the prefetched sample.
+        gallery = [gallery for gallery in galleries if gallery.pk == self.test_gallery.pk][0]
+        samples = gallery.sample()
+        self.assertEqual(len(gallery.sample(count=1)), 1)
+        self.assertIs(gallery.sample(), samples)
+        self.assertEqual(len(gallery.sample()), 2)
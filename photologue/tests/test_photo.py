@@ -1,8 +1,12 @@
 import os
 from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.db import DatabaseError
+from django.db.models import F
+from .. import models, queues, viewcounts
 from ..models import Image, Photo, PHOTOLOGUE_DIR
-from .factories import LANDSCAPE_IMAGE_PATH, QUOTING_IMAGE_PATH, \
-    GalleryFactory, PhotoFactory
+from .factories import LANDSCAPE_IMAGE_PATH, PORTRAIT_IMAGE_PATH, QUOTING_IMAGE_PATH, \
+    GalleryFactory, PhotoFactory, PhotoSizeFactory
 from .helpers import PhotologueBaseTest
 
 
@@ -42,11 +46,72 @@ class PhotoTest(PhotologueBaseTest):
         for i in range(5):
             self.pl.get_testPhotoSize_url()
         self.assertEqual(self.pl.view_count, 5)
+        self.assertEqual(Photo.objects.get(pk=self.pl.pk).view_count, 5)
+
+    def test_buffered_count(self):
+        """Views can be buffered, and written with a single update."""
+        self.s.increment_count = True
+        self.s.save()
+        self.pl2 = PhotoFactory()
+        flush_interval = viewcounts.FLUSH_INTERVAL
+        viewcounts.FLUSH_INTERVAL = 3600
+        try:
+            viewcounts.flush_view_counts()
+            for i in range(3):
+                self.pl.get_testPhotoSize_url()
+                self.pl2.get_testPhotoSize_url()
+            self.assertEqual(self.pl.view_count, 3)
+            self.assertEqual(Photo.objects.get(pk=self.pl.pk).view_count, 0)
+            # Saving the photo does not write the views that are still buffered.
+            self.pl.save()
+            self.assertEqual(Photo.objects.get(pk=self.pl.pk).view_count, 0)
+            with self.assertNumQueries(1):
+                viewcounts.flush_view_counts()
+            self.assertEqual(Photo.objects.get(pk=self.pl.pk).view_count, 3)
+            self.assertEqual(Photo.objects.get(pk=self.pl2.pk).view_count, 3)
+        finally:
+            viewcounts.FLUSH_INTERVAL = flush_interval
+
+    def test_explicit_count(self):
+        """A view count set on the photo itself is saved."""
+        Photo.objects.filter(pk=self.pl.pk).update(view_count=10)
+        self.pl.view_count = 0
+        self.pl.save()
+        self.assertEqual(Photo.objects.get(pk=self.pl.pk).view_count, 0)
+
+    def test_save_deleted(self):
+        """Saving a photo whose row has been deleted inserts it again."""
+        Photo.objects.filter(pk=self.pl.pk).delete()
+        self.pl.save()
+        self.assertTrue(Photo.objects.filter(pk=self.pl.pk).exists())
+
+    def test_buffered_count_failure(self):
+        """Views that could not be written are kept for the next flush."""
+        self.s.increment_count = True
+        self.s.save()
+        flush_interval = viewcounts.FLUSH_INTERVAL
+        viewcounts.FLUSH_INTERVAL = 3600
+
+        def fail(name):
+            raise DatabaseError('Database is down.')
+        try:
+            viewcounts.flush_view_counts()
+            self.pl.get_testPhotoSize_url()
+            viewcounts.F = fail
+            self.assertRaises(DatabaseError, viewcounts.flush_view_counts)
+            viewcounts.F = F
+            self.pl.get_testPhotoSize_url()
+            viewcounts.flush_view_counts()
+            self.assertEqual(Photo.objects.get(pk=self.pl.pk).view_count, 2)
+        finally:
+            viewcounts.F = F
+            viewcounts.FLUSH_INTERVAL = flush_interval
 
     def test_precache(self):
         # set the thumbnail photo size to pre-cache
         self.s.pre_cache = True
         self.s.save()
+        queues.process_rendition_jobs()
         # make sure it created the file
         self.assertTrue(self.pl.image.storage.exists(
             self.pl.get_testPhotoSize_filename()))
@@ -57,17 +122,177 @@ class PhotoTest(PhotologueBaseTest):
         self.assertFalse(self.pl.image.storage.exists(
             self.pl.get_testPhotoSize_filename()))
 
+    def test_accessor_methods_unknown_size(self):
+        self.assertFalse(hasattr(self.pl, 'get_unknownSize_url'))
+        self.assertRaises(AttributeError, getattr, self.pl, 'get_unknownSize_url')
+
+    def test_accessor_methods_new_size(self):
+        """The accessor methods of a size are available on photos loaded before
+        the size was created."""
+        photo = Photo.objects.get(pk=self.pl.pk)
+        size = PhotoSizeFactory(name='testNewSize', width=50)
+        self.assertEqual(photo.get_testNewSize_photosize(), size)
+
     def test_accessor_methods(self):
         self.assertEqual(self.pl.get_testPhotoSize_photosize(), self.s)
         self.assertEqual(self.pl.get_testPhotoSize_size(),
                          Image.open(self.pl.image.storage.open(
                             self.pl.get_testPhotoSize_filename())).size)
+        version = self.pl._get_size_version(self.s)
         self.assertEqual(self.pl.get_testPhotoSize_url(),
                          self.pl.cache_url() + '/' +
-                         self.pl._get_filename_for_size(self.s))
+                         self.pl._get_filename_for_size(self.s, version))
         self.assertEqual(self.pl.get_testPhotoSize_filename(),
                          os.path.join(self.pl.cache_path(),
-                                      self.pl._get_filename_for_size(self.s)))
+                                      self.pl._get_filename_for_size(self.s, version)))
+
+    def test_cached_sizes(self):
+        """Cached sizes are recorded on the photo, so that checking for them
+        does not need to query the storage."""
+        self.assertFalse(self.pl.size_exists(self.s))
+        self.pl.create_size(self.s)
+        self.assertTrue(self.pl.size_exists(self.s))
+
+        # The record is saved along with the photo.
+        pl = Photo.objects.get(pk=self.pl.pk)
+        self.assertTrue(pl.size_exists(self.s))
+
+        # The record is trusted, the storage does not get checked again.
+        self.pl.image.storage.delete(self.pl.get_testPhotoSize_filename())
+        self.assertTrue(pl.size_exists(self.s))
+
+        # Changing the photo size makes the cached size stale.
+        self.s.width = 50
+        self.assertFalse(pl.size_exists(self.s))
+
+    def test_concurrent_cached_sizes(self):
+        """Sizes of the same photo recorded by different processes are all kept,
+        and creating a size again keeps its url."""
+        size = PhotoSizeFactory(name='testNewSize', width=50)
+        pl = Photo.objects.get(pk=self.pl.pk)
+        self.pl.create_size(self.s)
+        pl.create_size(size)
+        pl = Photo.objects.get(pk=self.pl.pk)
+        self.assertTrue(pl.size_exists(self.s))
+        self.assertTrue(pl.size_exists(size))
+
+        url = pl.get_testPhotoSize_url()
+        Photo.objects.filter(pk=self.pl.pk).update(cached_sizes='{}')
+        pl = Photo.objects.get(pk=self.pl.pk)
+        pl.create_size(self.s)
+        self.assertEqual(pl.get_testPhotoSize_url(), url)
+        pl.clear_cache()
+        size.delete()
+
+    def test_legacy_cached_sizes(self):
+        """Sizes cached before their record existed are looked for once, and
+        recorded all together."""
+        storage = self.pl.image.storage
+        self.pl.create_size(self.s)
+        filename = self.pl.get_testPhotoSize_filename()
+        legacy = os.path.join(self.pl.cache_path(), self.pl._get_filename_for_size(self.s))
+        f = storage.open(filename)
+        content = ContentFile(f.read())
+        f.close()
+        storage.save(legacy, content)
+        storage.delete(filename)
+        Photo.objects.filter(pk=self.pl.pk).update(cached_sizes='')
+
+        pl = Photo.objects.get(pk=self.pl.pk)
+        self.assertTrue(pl.size_exists(self.s))
+        self.assertEqual(pl.get_testPhotoSize_filename(), legacy)
+        pl = Photo.objects.get(pk=self.pl.pk)
+        self.assertEqual(pl.get_testPhotoSize_filename(), legacy)
+
+        # Once looked for, missing sizes are not looked for again.
+        storage.delete(legacy)
+        Photo.objects.filter(pk=self.pl.pk).update(cached_sizes='')
+        pl = Photo.objects.get(pk=self.pl.pk)
+        self.assertFalse(pl.size_exists(self.s))
+        storage.save(legacy, content)
+        try:
+            pl = Photo.objects.get(pk=self.pl.pk)
+            self.assertFalse(pl.size_exists(self.s))
+        finally:
+            storage.delete(legacy)
+
+    def test_cached_size_dimensions(self):
+        """The dimensions and file size of a cached size are recorded when it
+        is created, and the size accessor does not reopen the image."""
+        size = self.pl.get_testPhotoSize_size()
+        filename = self.pl.get_testPhotoSize_filename()
+        entry = self.pl._get_manifest()['testPhotoSize']
+        self.assertEqual((entry['width'], entry['height']), size)
+        self.assertEqual(entry['bytes'], self.pl.image.storage.size(filename))
+
+        self.pl.image.storage.delete(filename)
+        self.assertEqual(self.pl.get_testPhotoSize_size(), size)
+
+    def test_cached_sizes_removed(self):
+        self.pl.create_size(self.s)
+        self.pl.remove_size(self.s)
+        self.assertFalse(self.pl.size_exists(self.s))
+        self.assertEqual(Photo.objects.get(pk=self.pl.pk).cached_sizes, '{}')
+
+    def test_save_keeps_cached_sizes(self):
+        """Saving a photo does not touch its cached sizes; those that went
+        stale are deleted by sweep_cache()."""
+        self.pl.create_size(self.s)
+        filename = self.pl.get_testPhotoSize_filename()
+        self.pl.caption = 'A new caption'
+        self.pl.save()
+        self.assertTrue(self.pl.size_exists(self.s))
+        self.assertTrue(self.pl.image.storage.exists(filename))
+        self.assertEqual(self.pl.sweep_cache(), 0)
+
+        self.pl.crop_from = 'top'
+        self.pl.save()
+        self.assertFalse(self.pl.size_exists(self.s))
+        self.assertTrue(self.pl.image.storage.exists(filename))
+        self.assertEqual(self.pl.sweep_cache(), 1)
+        self.assertFalse(self.pl.image.storage.exists(filename))
+        self.assertEqual(Photo.objects.get(pk=self.pl.pk).cached_sizes, '{}')
+
+    def test_save_keeps_recorded_sizes(self):
+        """Saving a photo loaded earlier does not overwrite the cached sizes
+        recorded since, e.g. by a worker."""
+        pl = Photo.objects.get(pk=self.pl.pk)
+        self.pl.create_size(self.s)
+        pl.caption = 'A new caption'
+        pl.save()
+        pl = Photo.objects.get(pk=self.pl.pk)
+        self.assertEqual(pl.caption, 'A new caption')
+        self.assertTrue(pl.size_exists(self.s))
+
+    def test_save_changed_cached_sizes(self):
+        """A record of cached sizes changed on the photo itself is saved."""
+        self.pl.create_size(self.s)
+        self.pl.save()
+        self.assertTrue(Photo.objects.get(pk=self.pl.pk).size_exists(self.s))
+        self.pl.cached_sizes = '{}'
+        self.pl.save()
+        self.assertEqual(Photo.objects.get(pk=self.pl.pk).cached_sizes, '{}')
+
+    def test_with_rendition_urls(self):
+        """The urls of cached sizes can be worked out for a whole queryset."""
+        pl = Photo.objects.with_rendition_urls('testPhotoSize').filter(pk=self.pl.pk)[0]
+        self.assertTrue(pl.size_exists(self.s))
+        self.assertEqual(pl.rendition_urls['testPhotoSize'],
+                         self.pl.cache_url() + '/test_photologue_landscape_testPhotoSize_{0}.jpg'.format(
+                             self.pl._get_size_version(self.s)))
+        self.assertEqual(pl.get_testPhotoSize_url(), pl.rendition_urls['testPhotoSize'])
+
+    def test_rendition_base_url(self):
+        base_url = models.RENDITION_BASE_URL
+        models.RENDITION_BASE_URL = 'http://cdn.example.com/media/'
+        try:
+            self.pl2 = PhotoFactory(image__from_path=QUOTING_IMAGE_PATH)
+            self.assertEqual(self.pl2.get_testPhotoSize_url(),
+                             'http://cdn.example.com/media/' + self.pl2.cache_path().replace(os.sep, '/') +
+                             '/test_photologue_%26quoting_testPhotoSize_{0}.jpg'.format(
+                                 self.pl2._get_size_version(self.s)))
+        finally:
+            models.RENDITION_BASE_URL = base_url
 
     def test_quoted_url(self):
         """Test for issue #29 - filenames of photos are incorrectly quoted when
@@ -75,12 +300,32 @@ class PhotoTest(PhotologueBaseTest):
 
         # Check that a 'normal' path works ok.
         self.assertEqual(self.pl.get_testPhotoSize_url(),
-                         self.pl.cache_url() + '/test_photologue_landscape_testPhotoSize.jpg')
+                         self.pl.cache_url() + '/test_photologue_landscape_testPhotoSize_{0}.jpg'.format(
+                             self.pl._get_size_version(self.s)))
 
         # Now create a Photo with a name that needs quoting.
         self.pl2 = PhotoFactory(image__from_path=QUOTING_IMAGE_PATH)
         self.assertEqual(self.pl2.get_testPhotoSize_url(),
-                         self.pl2.cache_url() + '/test_photologue_%26quoting_testPhotoSize.jpg')
+                         self.pl2.cache_url() + '/test_photologue_%26quoting_testPhotoSize_{0}.jpg'.format(
+                             self.pl2._get_size_version(self.s)))
+
+    def test_versioned_url(self):
+        """A new version of a cached size gets a new url, and a new image gets
+        a new version even if it has the same name."""
+        url = self.pl.get_testPhotoSize_url()
+        self.pl.crop_from = 'top'
+        self.pl.save()
+        self.assertNotEqual(self.pl.get_testPhotoSize_url(), url)
+        url = self.pl.get_testPhotoSize_url()
+
+        name, image_hash = self.pl.image.name, self.pl.image_hash
+        self.pl.image.storage.delete(name)
+        with open(PORTRAIT_IMAGE_PATH, mode='rb') as f:
+            self.pl.image = File(f, name=os.path.basename(name))
+            self.pl.save()
+        self.assertEqual(self.pl.image.name, name)
+        self.assertNotEqual(self.pl.image_hash, image_hash)
+        self.assertNotEqual(self.pl.get_testPhotoSize_url(), url)
 
 
 class PhotoManagerTest(PhotologueBaseTest):
@@ -182,6 +427,16 @@ class PreviousNextTest(PhotologueBaseTest):
         self.assertEqual(self.pl3.get_next_in_gallery(self.test_gallery),
                          None)
 
+    def test_neighbours(self):
+        """Both neighbours are found with one query."""
+        with self.assertNumQueries(1):
+            self.assertEqual(self.pl2.get_neighbours(self.test_gallery), (self.pl1, self.pl3))
+        self.assertEqual(self.pl1.get_neighbours(self.test_gallery), (None, self.pl2))
+
+        # The position in the gallery counts, not the order in which photos were added.
+        self.test_gallery.photos = [self.pl3, self.pl1, self.pl2]
+        self.assertEqual(self.pl1.get_neighbours(self.test_gallery), (self.pl3, self.pl2))
+
     def test_next_gallery_mismatch(self):
         """Photo does not belong to the gallery."""
         self.pl4 = PhotoFactory()
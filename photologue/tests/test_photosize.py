@@ -1,5 +1,7 @@
 from django.core.exceptions import ValidationError
 
+from .. import queues
+from ..models import Photo, RenditionJob
 from .factories import PhotoSizeFactory
 from .helpers import PhotologueBaseTest
 
@@ -28,3 +30,42 @@ class PhotoSizeNameTest(PhotologueBaseTest):
             photosize = PhotoSizeFactory(name=name)
             photosize.full_clean()
 
+
+class PhotoSizeChangeTest(PhotologueBaseTest):
+
+    def setUp(self):
+        super(PhotoSizeChangeTest, self).setUp()
+        self.pl.create_size(self.s)
+        self.filename = self.pl.get_testPhotoSize_filename()
+
+    def test_change_not_affecting_output(self):
+        """Cached sizes are left alone if the way they look did not change."""
+        self.s.increment_count = True
+        self.s.save()
+        self.assertFalse(RenditionJob.objects.exists())
+        self.assertTrue(self.pl.image.storage.exists(self.filename))
+        self.assertTrue(Photo.objects.get(pk=self.pl.pk).size_exists(self.s))
+
+    def test_change_affecting_output(self):
+        """Stale cached sizes are removed, and created again if pre-cached, by
+        plworker."""
+        self.s.width = 50
+        self.s.save()
+        self.assertTrue(RenditionJob.objects.exists())
+        self.assertTrue(self.pl.image.storage.exists(self.filename))
+        queues.process_rendition_jobs()
+        self.assertFalse(RenditionJob.objects.exists())
+        self.assertFalse(self.pl.image.storage.exists(self.filename))
+
+        self.s.pre_cache = True
+        self.s.save()
+        self.assertFalse(Photo.objects.get(pk=self.pl.pk).size_exists(self.s))
+        queues.process_rendition_jobs()
+        self.assertTrue(Photo.objects.get(pk=self.pl.pk).size_exists(self.s))
+
+    def test_rename(self):
+        self.s.name = 'renamed'
+        self.s.save()
+        queues.process_rendition_jobs()
+        self.assertFalse(self.pl.image.storage.exists(self.filename))
+        self.assertEqual(Photo.objects.get(pk=self.pl.pk).cached_sizes, '{}')
@@ -0,0 +1,104 @@
+from .. import queues
+from ..models import Photo, QueuedSize, RenditionJob
+from .factories import PhotoFactory
+from .helpers import PhotologueBaseTest
+
+
+class DatabaseQueueTest(PhotologueBaseTest):
+
+    def setUp(self):
+        super(DatabaseQueueTest, self).setUp()
+        self._current_queue = queues.QUEUE
+        queues.QUEUE = 'photologue.queues.DatabaseQueue'
+        # Start with a queue that has not seen any sizes yet.
+        queues._queues.pop(queues.QUEUE, None)
+
+    def tearDown(self):
+        queues._queues.pop(queues.QUEUE, None)
+        queues.QUEUE = self._current_queue
+        super(DatabaseQueueTest, self).tearDown()
+
+    def test_url_returns_at_once(self):
+        """Asking for the url of a missing size queues it instead of creating it."""
+        self.assertEqual(self.pl.get_testPhotoSize_url(),
+                         self.pl.cache_url() + '/test_photologue_landscape_testPhotoSize_{0}.jpg'.format(
+                             self.pl._get_size_version(self.s)))
+        self.assertFalse(self.pl.image.storage.exists(
+            self.pl.get_testPhotoSize_filename()))
+        # The sizes are written at the end of the request.
+        self.assertEqual(QueuedSize.objects.count(), 0)
+        queues.flush_queue()
+        self.assertEqual(QueuedSize.objects.count(), 1)
+
+        # The same size does not get queued twice, nor looked up again.
+        with self.assertNumQueries(0):
+            self.pl.get_testPhotoSize_url()
+            queues.flush_queue()
+        self.assertEqual(QueuedSize.objects.count(), 1)
+
+    def test_batched_inserts(self):
+        """The sizes of several photos are written together, skipping those
+        that are already queued."""
+        self.pl.get_testPhotoSize_url()
+        queues.flush_queue()
+        queues._queues.pop(queues.QUEUE)
+        self.pl2 = PhotoFactory()
+        self.pl.get_testPhotoSize_url()
+        self.pl2.get_testPhotoSize_url()
+        queues.flush_queue()
+        self.assertEqual(sorted(QueuedSize.objects.values_list('object_id', flat=True)),
+                         sorted([self.pl.pk, self.pl2.pk]))
+        self.pl2.delete()
+
+    def test_process_queue(self):
+        self.pl.get_testPhotoSize_url()
+        queues.flush_queue()
+        self.assertEqual(queues.process_queue(), 1)
+        self.assertEqual(QueuedSize.objects.count(), 0)
+        self.assertTrue(Photo.objects.get(pk=self.pl.pk).size_exists(self.s))
+
+    def test_process_queue_deleted_photo(self):
+        """Sizes queued for a photo that has since been deleted are discarded."""
+        self.pl.get_testPhotoSize_url()
+        queues.flush_queue()
+        QueuedSize.objects.update(object_id=self.pl.pk + 1000)
+        self.assertEqual(queues.process_queue(), 0)
+        self.assertEqual(QueuedSize.objects.count(), 0)
+
+    def test_rendition_job(self):
+        """Changing a photo size leaves the photos to update to plworker."""
+        self.s.pre_cache = True
+        self.s.save()
+        job = RenditionJob.objects.get()
+        self.assertEqual((job.size_name, job.total), ('testPhotoSize', 1))
+        self.assertFalse(Photo.objects.get(pk=self.pl.pk).size_exists(self.s))
+
+        self.assertEqual(queues.process_rendition_jobs(), 1)
+        self.assertFalse(RenditionJob.objects.exists())
+        self.assertTrue(Photo.objects.get(pk=self.pl.pk).size_exists(self.s))
+
+
+class SynchronousQueueTest(PhotologueBaseTest):
+
+    def setUp(self):
+        super(SynchronousQueueTest, self).setUp()
+        self.pl2 = PhotoFactory()
+
+    def tearDown(self):
+        self.pl2.delete()
+        super(SynchronousQueueTest, self).tearDown()
+
+    def test_rendition_job(self):
+        """Changing a photo size only records the job; the stale sizes of a
+        photo are created when asked for, or by plworker."""
+        self.s.pre_cache = True
+        self.s.save()
+        self.assertEqual(RenditionJob.objects.get().processed, 0)
+        self.assertEqual([Photo.objects.get(pk=photo.pk).size_exists(self.s) for photo in (self.pl, self.pl2)],
+                         [False, False])
+
+        Photo.objects.get(pk=self.pl.pk).get_testPhotoSize_url()
+        self.assertTrue(Photo.objects.get(pk=self.pl.pk).size_exists(self.s))
+        self.assertEqual(queues.process_rendition_jobs(), 2)
+        self.assertFalse(RenditionJob.objects.exists())
+        self.assertTrue(Photo.objects.get(pk=self.pl2.pk).size_exists(self.s))
@@ -1,8 +1,11 @@
 import unittest
 from django.core.exceptions import ValidationError
+from .. import models
 from ..models import PhotoSizeCache, PhotoSize
+from ..utils.caching import get_cache
 from .helpers import PhotologueBaseTest
-from .factories import SQUARE_IMAGE_PATH, PORTRAIT_IMAGE_PATH, PhotoFactory
+from .factories import SQUARE_IMAGE_PATH, PORTRAIT_IMAGE_PATH, PhotoFactory, \
+    PhotoSizeFactory
 
 
 class PhotoSizeTest(unittest.TestCase):
@@ -116,6 +119,22 @@ class ImageResizeTest(PhotologueBaseTest):
         self.s.save()
         self.assertEqual(self.pl.get_testPhotoSize_size(), (1000, 1000))
 
+    def test_resize_reduced_decode(self):
+        """Small sizes of a JPEG are resized from a downscaled decode of the
+        image, but still come out at the right dimensions."""
+        self.s.size = (40, 40)
+        self.s.save()
+        self.assertEqual(self.pl.get_testPhotoSize_size(), (40, 30))
+        self.assertEqual(self.pp.get_testPhotoSize_size(), (30, 40))
+        self.assertEqual(self.ps.get_testPhotoSize_size(), (40, 40))
+
+    def test_resize_reduced_decode_cropped(self):
+        self.s.size = (40, 20)
+        self.s.crop = True
+        self.s.save()
+        self.assertEqual(self.pl.get_testPhotoSize_size(), (40, 20))
+        self.assertEqual(self.pp.get_testPhotoSize_size(), (40, 20))
+
     def test_resize_upscale(self):
         self.s.size = (1000, 1000)
         self.s.upscale = True
@@ -125,8 +144,75 @@ class ImageResizeTest(PhotologueBaseTest):
         self.assertEqual(self.ps.get_testPhotoSize_size(), (1000, 1000))
 
 
+class CreateSizesTest(PhotologueBaseTest):
+
+    def test_create_sizes(self):
+        """Creating several sizes in one go gives the same results as creating
+        them one at a time."""
+        small = PhotoSizeFactory(name='testSmall', width=50, height=50, crop=True)
+        wide = PhotoSizeFactory(name='testWide', width=120)
+        self.pl.create_sizes([small, self.s, wide])
+        for photosize in (small, self.s, wide):
+            self.assertTrue(self.pl.size_exists(photosize))
+        self.assertEqual(self.pl._get_SIZE_size('testPhotoSize'), (100, 75))
+        self.assertEqual(self.pl._get_SIZE_size('testSmall'), (50, 50))
+        self.assertEqual(self.pl._get_SIZE_size('testWide'), (120, 90))
+
+
+class MaxPixelsTest(PhotologueBaseTest):
+
+    def setUp(self):
+        super(MaxPixelsTest, self).setUp()
+        self._max_pixels = models.MAX_PIXELS
+        self._counts = dict(models.oversized_image_counts)
+
+    def tearDown(self):
+        models.MAX_PIXELS = self._max_pixels
+        super(MaxPixelsTest, self).tearDown()
+
+    def test_reduced(self):
+        """A jpeg over the budget is decoded at a reduced scale."""
+        models.MAX_PIXELS = 20000
+        self.assertEqual(self.pl.get_testPhotoSize_size(), (100, 75))
+        self.assertEqual(models.oversized_image_counts['reduced'], self._counts['reduced'] + 1)
+
+    def test_rejected(self):
+        """An image that cannot be decoded within the budget is left alone."""
+        models.MAX_PIXELS = 100
+        self.pl.create_size(self.s)
+        self.assertFalse(self.pl.size_exists(self.s))
+        self.assertEqual(models.oversized_image_counts['rejected'], self._counts['rejected'] + 1)
+
+
 class PhotoSizeCacheTest(PhotologueBaseTest):
 
     def test(self):
         cache = PhotoSizeCache()
         self.assertEqual(cache.sizes['testPhotoSize'], self.s)
+
+    def test_other_process(self):
+        """Each process reloads the sizes only once their version has changed."""
+        check_interval = models.SIZES_CHECK_INTERVAL
+        models.SIZES_CHECK_INTERVAL = 0
+        try:
+            self.assertEqual(PhotoSizeCache().sizes['testPhotoSize'].width, 100)
+            PhotoSize.objects.filter(pk=self.s.pk).update(width=50)
+            with self.assertNumQueries(0):
+                self.assertEqual(PhotoSizeCache().sizes['testPhotoSize'].width, 100)
+            # What PhotoSizeCache().reset() does in another process.
+            get_cache().set(models.SIZES_VERSION_KEY, 'changed', None)
+            self.assertEqual(PhotoSizeCache().sizes['testPhotoSize'].width, 50)
+        finally:
+            models.SIZES_CHECK_INTERVAL = check_interval
+
+    def test_reset(self):
+        """Saving a size stores the new sizes along with their version, so that
+        other processes do not load them from the database, where the change
+        may not be committed yet."""
+        self.s.width = 60
+        self.s.save()
+        cache = get_cache()
+        sizes = cache.get(models.SIZES_KEY.format(cache.get(models.SIZES_VERSION_KEY)))
+        self.assertEqual([size.width for size in sizes if size.name == 'testPhotoSize'], [60])
+        with self.assertNumQueries(0):
+            self.assertEqual(PhotoSizeCache().sizes['testPhotoSize'].width, 60)
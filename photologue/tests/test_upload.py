@@ -0,0 +1,106 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.utils.timezone import now
+
+from .. import models
+from ..models import Gallery, Photo, UploadSession, UploadChunk
+from .factories import SAMPLE_ZIP_PATH, IGNORED_FILES_ZIP_PATH, LANDSCAPE_IMAGE_PATH
+
+
+class UploadSessionTest(TestCase):
+
+    urls = 'photologue.tests.test_urls'
+
+    def setUp(self):
+        super(UploadSessionTest, self).setUp()
+        User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.login(username='admin', password='admin')
+
+    def tearDown(self):
+        super(UploadSessionTest, self).tearDown()
+        for photo in Photo.objects.all():
+            photo.delete()
+        for session in UploadSession.objects.all():
+            session.delete()
+
+    def start(self, path):
+        with open(path, mode='rb') as f:
+            self.data = f.read()
+        response = self.client.post(reverse('photologue-upload'),
+                                    {'title': 'Test', 'is_public': 'on', 'size': len(self.data)})
+        self.assertEqual(response.status_code, 201)
+        return json.loads(response.content.decode('utf-8'))['id']
+
+    def send(self, pk, offset, data):
+        response = self.client.post(reverse('photologue-upload-chunk', args=[pk, offset]),
+                                    data,
+                                    content_type='application/octet-stream')
+        return response.status_code, json.loads(response.content.decode('utf-8'))
+
+    def complete(self, pk):
+        return self.client.post(reverse('photologue-upload-complete', args=[pk])).status_code
+
+    def test_upload(self):
+        pk = self.start(SAMPLE_ZIP_PATH)
+        for offset in range(0, len(self.data), 4096):
+            status, state = self.send(pk, offset, self.data[offset:offset + 4096])
+            self.assertEqual(status, 200)
+        self.assertEqual(state['received'], len(self.data))
+        self.assertEqual(self.complete(pk), 200)
+
+        gallery = Gallery.objects.get(title='Test')
+        self.assertQuerysetEqual(gallery.photos.all(),
+                                 ['<Photo: Test 1>'])
+        self.assertFalse(UploadChunk.objects.exists())
+
+    def test_chunks_stored(self):
+        """The chunks are only stored; the photos are created on completion."""
+        pk = self.start(IGNORED_FILES_ZIP_PATH)
+        self.send(pk, 0, self.data[:8000])
+        self.assertFalse(Photo.objects.exists())
+        self.send(pk, 8000, self.data[8000:])
+        self.assertFalse(Photo.objects.exists())
+        self.assertEqual(self.complete(pk), 200)
+        self.assertEqual(Photo.objects.count(), 2)
+
+    def test_expired(self):
+        """Uploads that were never completed are deleted with their chunks."""
+        pk = self.start(SAMPLE_ZIP_PATH)
+        self.send(pk, 0, self.data[:3000])
+        chunk = UploadChunk.objects.get()
+        self.assertEqual(UploadSession.delete_expired(), 0)
+
+        started = now() - timedelta(seconds=models.UPLOAD_SESSION_EXPIRY + 60)
+        UploadSession.objects.filter(pk=pk).update(created=started)
+        self.assertEqual(UploadSession.delete_expired(), 1)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(UploadChunk.objects.exists())
+        self.assertFalse(chunk.file.storage.exists(chunk.file.name))
+
+    def test_resume(self):
+        """Data that has already arrived can be sent again, but gaps are refused."""
+        pk = self.start(SAMPLE_ZIP_PATH)
+        self.send(pk, 0, self.data[:3000])
+        status, state = self.send(pk, 2000, self.data[2000:5000])
+        self.assertEqual((status, state['received']), (200, 5000))
+        status, state = self.send(pk, 6000, self.data[6000:])
+        self.assertEqual((status, state['received']), (409, 5000))
+        self.assertEqual(self.complete(pk), 409)
+        self.send(pk, 5000, self.data[5000:])
+        self.assertEqual(self.complete(pk), 200)
+        self.assertQuerysetEqual(Photo.objects.all(),
+                                 ['<Photo: Test 1>'])
+
+    def test_not_zip(self):
+        pk = self.start(LANDSCAPE_IMAGE_PATH)
+        self.send(pk, 0, self.data)
+        self.assertEqual(self.complete(pk), 400)
+
+    def test_permission(self):
+        self.client.logout()
+        response = self.client.post(reverse('photologue-upload'), {'title': 'Test'})
+        self.assertEqual(response.status_code, 403)
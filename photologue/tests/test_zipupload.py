@@ -1,10 +1,18 @@
+import os
+import zipfile
+from io import BytesIO
+
 from django.test import TestCase
 from django.core.files import File
 from django.core.exceptions import ValidationError
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.contrib.sites.models import Site
 
+from .. import models
 from ..models import GalleryUpload, Gallery, Photo
 from .factories import GalleryFactory, PhotoFactory, SAMPLE_ZIP_PATH, SAMPLE_NOT_IMAGE_ZIP_PATH, \
-    IGNORED_FILES_ZIP_PATH
+    IGNORED_FILES_ZIP_PATH, CORRUPT_ZIP_PATH, LANDSCAPE_IMAGE_PATH
 
 
 class GalleryUploadTest(TestCase):
@@ -63,6 +71,36 @@ class GalleryUploadTest(TestCase):
         self.assertQuerysetEqual(Photo.objects.all(),
                                  ['<Photo: Test 1>'])
 
+    def test_corrupt(self):
+        """A zip with a corrupt file in it ('broken.jpg').
+        That file gets skipped, the rest of the zip is still processed."""
+
+        with open(CORRUPT_ZIP_PATH, mode='rb') as f:
+            test_file = File(f)
+            GalleryUpload.objects.create(title='Test',
+                                         zip_file=test_file)
+
+        self.assertQuerysetEqual(Gallery.objects.all(),
+                                 ['<Gallery: Test>'])
+        self.assertQuerysetEqual(Photo.objects.all(),
+                                 ['<Photo: Test 1>'])
+
+    def test_small_member(self):
+        """An image that is small enough to be extracted in memory."""
+
+        archive = BytesIO()
+        zip = zipfile.ZipFile(archive, 'w')
+        zip.write(LANDSCAPE_IMAGE_PATH, 'landscape.jpg')
+        zip.close()
+        archive.seek(0)
+
+        with self.settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1024 * 1024):
+            GalleryUpload.objects.create(title='Test',
+                                         zip_file=File(archive, name='small.zip'))
+
+        photo = Photo.objects.get()
+        self.assertEqual(photo.image.size, os.path.getsize(LANDSCAPE_IMAGE_PATH))
+
     def test_existing(self):
         """Add the photos in the zip to an existing gallery."""
 
@@ -125,3 +163,81 @@ class GalleryUploadTest(TestCase):
         gallery = Gallery.objects.get(title='Test')
         self.assertQuerysetEqual(gallery.photos.all(),
                                  [])
+
+
+class BulkGalleryUploadTest(GalleryUploadTest):
+
+    """Run the same tests, importing the photos with PHOTOLOGUE_ZIP_IMPORT_WORKERS."""
+
+    def setUp(self):
+        super(BulkGalleryUploadTest, self).setUp()
+        self._workers = models.ZIP_IMPORT_WORKERS
+        models.ZIP_IMPORT_WORKERS = 2
+
+    def tearDown(self):
+        models.ZIP_IMPORT_WORKERS = self._workers
+        super(BulkGalleryUploadTest, self).tearDown()
+
+    def test_links(self):
+        """Photos are added to the current site, and after the photos already in
+        the gallery."""
+
+        existing = GalleryFactory(title='Existing')
+        photo = PhotoFactory(title='Existing photo')
+        existing.photos.add(photo)
+
+        with open(SAMPLE_ZIP_PATH, mode='rb') as f:
+            test_file = File(f)
+            GalleryUpload.objects.create(title='Test',
+                                         zip_file=test_file,
+                                         gallery=existing)
+
+        self.assertQuerysetEqual(existing.photos.all(),
+                                 ['<Photo: Existing photo>', '<Photo: Test 1>'])
+        self.assertQuerysetEqual(Photo.objects.get(title='Test 1').sites.all(),
+                                 ['<Site: {0}>'.format(Site.objects.get(id=settings.SITE_ID).domain)])
+
+    def test_store_failure(self):
+        """A photo whose image cannot be stored is skipped, and nothing is left
+        behind in the storage."""
+
+        def fail(photo):
+            raise IOError('Disk full')
+        original, Photo._set_date_taken = Photo._set_date_taken, fail
+        try:
+            with open(SAMPLE_ZIP_PATH, mode='rb') as f:
+                test_file = File(f)
+                GalleryUpload.objects.create(title='Test',
+                                             zip_file=test_file)
+        finally:
+            Photo._set_date_taken = original
+
+        self.assertQuerysetEqual(Photo.objects.all(), [])
+        self.assertFalse(default_storage.exists(os.path.join(models.PHOTOLOGUE_DIR, 'photos', 'sample.jpg')))
+
+    def test_store_failure_numbering(self):
+        """A photo whose image cannot be stored leaves no gap in the numbering."""
+
+        archive = BytesIO()
+        zip = zipfile.ZipFile(archive, 'w')
+        zip.write(LANDSCAPE_IMAGE_PATH, 'a.jpg')
+        zip.write(LANDSCAPE_IMAGE_PATH, 'b.jpg')
+        zip.close()
+        archive.seek(0)
+
+        original = Photo._set_date_taken
+
+        def fail(photo):
+            if os.path.basename(photo.image.name).startswith('a'):
+                raise IOError('Disk full')
+            original(photo)
+        Photo._set_date_taken = fail
+        try:
+            GalleryUpload.objects.create(title='Test',
+                                         zip_file=File(archive, name='test.zip'))
+        finally:
+            Photo._set_date_taken = original
+
+        photo = Photo.objects.get()
+        self.assertEqual(photo.title, 'Test 1')
+        self.assertTrue(os.path.basename(photo.image.name).startswith('b'))
@@ -5,7 +5,8 @@ from django.core.urlresolvers import reverse_lazy
 from .views import PhotoListView, PhotoDetailView, GalleryListView, \
     GalleryDetailView, PhotoArchiveIndexView, PhotoDateDetailView, PhotoDayArchiveView, \
     PhotoYearArchiveView, PhotoMonthArchiveView, GalleryArchiveIndexView, GalleryYearArchiveView, \
-    GalleryDateDetailView, GalleryDayArchiveView, GalleryMonthArchiveView
+    GalleryDateDetailView, GalleryDayArchiveView, GalleryMonthArchiveView, UploadStartView, \
+    UploadSessionView, UploadChunkView, UploadCompleteView
 
 """NOTE: the url names are changing. In the long term, I want the prefix on all url names to be 'photologue-'
 rather than 'pl-'.
@@ -65,6 +66,19 @@ urlpatterns = patterns('',
                            PhotoListView.as_view(),
                            name='photologue-photo-list'),
 
+                       url(r'^upload/$',
+                           UploadStartView.as_view(),
+                           name='photologue-upload'),
+                       url(r'^upload/(?P<pk>\d+)/$',
+                           UploadSessionView.as_view(),
+                           name='photologue-upload-session'),
+                       url(r'^upload/(?P<pk>\d+)/(?P<offset>\d+)/$',
+                           UploadChunkView.as_view(),
+                           name='photologue-upload-chunk'),
+                       url(r'^upload/(?P<pk>\d+)/complete/$',
+                           UploadCompleteView.as_view(),
+                           name='photologue-upload-complete'),
+
                        # Deprecated URLs.
                        url(r'^album/page/(?P<page>[0-9]+)/$',
                            GalleryListView.as_view(),
@@ -0,0 +1,70 @@
+"""
+The cache that Photologue keeps data in, to share it between processes.
+
+Set ``PHOTOLOGUE_CACHE`` to the alias of one of the caches in the ``CACHES``
+setting to use it rather than the default cache.
+
+``LRUCache`` is for data that is expensive to build but only needed within one
+process, such as decoded images.
+"""
+import threading
+
+from django.conf import settings
+
+try:
+    from django.core.cache import caches
+except ImportError:
+    # Django 1.6.
+    from django.core.cache import get_cache as _get_cache
+    caches = None
+
+CACHE = getattr(settings, 'PHOTOLOGUE_CACHE', 'default')
+
+_cache = None
+
+
+def get_cache():
+    """Return the cache configured with ``PHOTOLOGUE_CACHE``."""
+    global _cache
+    if caches is not None:
+        # Django keeps one connection per thread.
+        return caches[CACHE]
+    if _cache is None:
+        _cache = _get_cache(CACHE)
+    return _cache
+
+
+class LRUCache(object):
+
+    """A thread-safe cache holding up to ``max_size`` items; the least recently
+    used item is dropped first. Meant for a handful of large items."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.data = {}
+        self.order = []
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.data:
+                return default
+            self.order.remove(key)
+            self.order.append(key)
+            return self.data[key]
+
+    def set(self, key, value):
+        if self.max_size < 1:
+            return
+        with self.lock:
+            if key in self.data:
+                self.order.remove(key)
+            self.data[key] = value
+            self.order.append(key)
+            while len(self.order) > self.max_size:
+                del self.data[self.order.pop(0)]
+
+    def clear(self):
+        with self.lock:
+            self.data = {}
+            self.order = []
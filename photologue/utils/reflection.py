@@ -40,6 +40,12 @@ except ImportError:
     except ImportError:
         raise ImportError("The Python Imaging Library was not found.")
 
+from .caching import LRUCache
+
+# Gradient masks, by image size and effect settings; photos are mostly resized to
+# a handful of sizes, so the same masks keep coming back.
+_masks = LRUCache(16)
+
 
 def add_reflection(im, bgcolor="#00000", amount=0.4, opacity=0.6):
     """ Returns the supplied PIL Image (im) with a reflection effect
@@ -55,31 +61,17 @@ def add_reflection(im, bgcolor="#00000", amount=0.4, opacity=0.6):
     # convert bgcolor string to rgb value
     background_color = ImageColor.getrgb(bgcolor)
 
-    # copy orignial image and flip the orientation
-    reflection = im.copy().transpose(Image.FLIP_TOP_BOTTOM)
-
-    # create a new image filled with the bgcolor the same size
-    background = Image.new("RGB", im.size, background_color)
-
-    # calculate our alpha mask
-    start = int(255 - (255 * opacity)) # The start of our gradient
-    steps = int(255 * amount) # the number of intermedite values
-    increment = (255 - start) / float(steps)
-    mask = Image.new('L', (1, 255))
-    for y in range(255):
-        if y < steps:
-            val = int(y * increment + start)
-        else:
-            val = 255
-        mask.putpixel((0, y), val)
-    alpha_mask = mask.resize(im.size)
-
-    # merge the reflection onto our background color using the alpha mask
-    reflection = Image.composite(background, reflection, alpha_mask)
-
-    # crop the reflection
+    # only the part of the image that gets reflected is worked on: its bottom
+    # strip, flipped
     reflection_height = int(im.size[1] * amount)
-    reflection = reflection.crop((0, 0, im.size[0], reflection_height))
+    strip = im.crop((0, im.size[1] - reflection_height, im.size[0], im.size[1]))
+    reflection = strip.transpose(Image.FLIP_TOP_BOTTOM)
+
+    # merge the reflection onto the bgcolor using the gradient mask
+    if reflection_height > 0:
+        background = Image.new("RGB", reflection.size, background_color)
+        mask = gradient_mask(im.size, reflection_height, amount, opacity)
+        reflection = Image.composite(background, reflection, mask)
 
     # create new image sized to hold both the original image and the reflection
     composite = Image.new("RGB", (im.size[0], im.size[1] + reflection_height), background_color)
@@ -90,3 +82,27 @@ def add_reflection(im, bgcolor="#00000", amount=0.4, opacity=0.6):
 
     # return the image complete with reflection effect
     return composite
+
+
+def gradient_mask(size, height, amount, opacity):
+    """ Returns the alpha mask of the reflection of an image of the supplied size
+
+    The gradient goes from the initial opacity to the bgcolor over 255 * amount
+    steps, stretched to the height of the image; only the top ``height`` rows,
+    which are the ones covering the reflection, are returned.
+
+    """
+    key = (size, height, amount, opacity)
+    mask = _masks.get(key)
+    if mask is None:
+        start = int(255 - (255 * opacity))  # The start of our gradient
+        steps = int(255 * amount)  # the number of intermedite values
+        increment = (255 - start) / float(max(steps, 1))
+        column = Image.new('L', (1, 255))
+        column.putdata([int(y * increment + start) if y < steps else 255 for y in range(255)])
+        # stretch a single column to the height of the image, and only then
+        # to its width, once it has been cropped to the reflection
+        column = column.resize((1, size[1]), Image.NEAREST).crop((0, 0, 1, height))
+        mask = column.resize((size[0], height), Image.NEAREST)
+        _masks.set(key, mask)
+    return mask
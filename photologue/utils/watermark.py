@@ -31,27 +31,70 @@ def apply_watermark(im, mark, position, opacity=1):
     """Adds a watermark to an image."""
     if opacity < 1:
         mark = reduce_opacity(mark, opacity)
-    if im.mode != 'RGBA':
-        im = im.convert('RGBA')
-    # create a transparent layer the size of the image and draw the
-    # watermark in that layer.
-    layer = Image.new('RGBA', im.size, (0, 0, 0, 0))
+    region, offset = watermark_region(mark, im.size, position)
+    return composite_region(im, region, offset)
+
+def watermark_layer(mark, size, position):
+    """Returns a transparent layer of the supplied size with the watermark
+    drawn in it. The layer only depends on its arguments, so it can be reused
+    for all the images of the same size."""
+    layer = Image.new('RGBA', size, (0, 0, 0, 0))
     if position == 'tile':
-        for y in range(0, im.size[1], mark.size[1]):
-            for x in range(0, im.size[0], mark.size[0]):
-                layer.paste(mark, (x, y))
+        # lay out one row of marks, then repeat the row
+        row = Image.new('RGBA', (size[0], mark.size[1]), (0, 0, 0, 0))
+        for x in range(0, size[0], mark.size[0]):
+            row.paste(mark, (x, 0))
+        for y in range(0, size[1], mark.size[1]):
+            layer.paste(row, (0, y))
     elif position == 'scale':
         # scale, but preserve the aspect ratio
         ratio = min(
-            float(im.size[0]) / mark.size[0], float(im.size[1]) / mark.size[1])
+            float(size[0]) / mark.size[0], float(size[1]) / mark.size[1])
         w = int(mark.size[0] * ratio)
         h = int(mark.size[1] * ratio)
         mark = mark.resize((w, h))
-        layer.paste(mark, ((im.size[0] - w) / 2, (im.size[1] - h) / 2))
+        layer.paste(mark, ((size[0] - w) // 2, (size[1] - h) // 2))
     else:
         layer.paste(mark, position)
-    # composite the watermark with the layer
-    return Image.composite(layer, im, layer)
+    return layer
+
+def watermark_region(mark, size, position):
+    """Returns the part of watermark_layer() that the watermark covers, and
+    its offset in the layer, without building the whole layer unless the
+    watermark is tiled. The region is None if the watermark is fully
+    transparent."""
+    if position == 'tile':
+        region, offset = watermark_layer(mark, size, position), (0, 0)
+    elif position == 'scale':
+        ratio = min(
+            float(size[0]) / mark.size[0], float(size[1]) / mark.size[1])
+        w = int(mark.size[0] * ratio)
+        h = int(mark.size[1] * ratio)
+        region, offset = mark.resize((w, h)), ((size[0] - w) // 2, (size[1] - h) // 2)
+    else:
+        region, offset = mark, tuple(position)
+    box = region.getbbox()
+    if box is None:
+        return None, (0, 0)
+    if box != (0, 0) + region.size:
+        region = region.crop(box)
+        region.load()
+        offset = (offset[0] + box[0], offset[1] + box[1])
+    return region, offset
+
+def composite_region(im, region, offset):
+    """Blends a region made by watermark_region() into an image.
+
+    The pixels that the region does not cover are left alone. Images without
+    transparency stay in RGB; the others are converted to RGBA.
+    """
+    if im.mode == 'RGB':
+        im = im.copy()
+    else:
+        im = im.convert('RGBA')
+    if region is not None:
+        im.paste(region, offset, region)
+    return im
 
 def test():
     im = Image.open('test.png')
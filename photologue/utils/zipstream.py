@@ -0,0 +1,225 @@
+"""
+Reading zip archives that are still being uploaded.
+
+A zip archive has its table of contents (the central directory) at the very
+end, which is why zipfile needs the whole archive before it can read anything.
+But each file in the archive is also preceded by a local header, so the files
+can be read one after the other from the start of the archive as its data
+arrives. ``read_member`` does that for the common cases, and gives up on the
+rest; these are then left for zipfile once the whole archive is there.
+"""
+import struct
+import zlib
+import zipfile
+from bisect import bisect_right
+from tempfile import SpooledTemporaryFile
+
+LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+DATA_DESCRIPTOR = struct.Struct('<III')
+DATA_DESCRIPTOR_SIGNATURE = b'PK\x07\x08'
+
+# Flag bits of the local header.
+FLAG_ENCRYPTED = 0x1
+FLAG_DATA_DESCRIPTOR = 0x8
+FLAG_UTF8 = 0x800
+
+BLOCK_SIZE = 64 * 1024
+
+
+class IncompleteMember(Exception):
+
+    """Not all the data of the file has arrived yet."""
+
+
+class UnsupportedMember(Exception):
+
+    """The file cannot be read before the whole archive has arrived."""
+
+
+class Member(object):
+
+    """A file read out of an archive.
+
+    ``file`` holds its contents, or is None if the file is corrupt. ``stop`` is
+    the offset in the archive at which the next local header starts.
+    """
+
+    def __init__(self, filename, size, file, stop):
+        self.filename = filename
+        self.size = size
+        self.file = file
+        self.stop = stop
+
+
+class ChunkedFile(object):
+
+    """A read-only file made up of pieces that are stored in a storage.
+
+    ``pieces`` is a list of (offset, size, name) tuples, in offset order and
+    without gaps.
+    """
+
+    def __init__(self, storage, pieces):
+        self.storage = storage
+        self.pieces = pieces
+        self.starts = [offset for offset, size, name in pieces]
+        self.size = pieces[-1][0] + pieces[-1][1] if pieces else 0
+        self.position = 0
+        self._index = None
+        self._file = None
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.position
+        elif whence == 2:
+            offset += self.size
+        if offset < 0:
+            raise IOError('Invalid offset {0}.'.format(offset))
+        self.position = offset
+        return self.position
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.position
+        data = []
+        while size > 0 and self.position < self.size:
+            index = bisect_right(self.starts, self.position) - 1
+            offset, length, name = self.pieces[index]
+            if self._index != index:
+                self.close()
+                self._file = self.storage.open(name, 'rb')
+                self._index = index
+            self._file.seek(self.position - offset)
+            block = self._file.read(min(size, offset + length - self.position))
+            if not block:
+                break
+            data.append(block)
+            self.position += len(block)
+            size -= len(block)
+        return b''.join(data)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._index = None
+
+
+def read_member(file, end, max_memory):
+    """Read the file whose local header starts at the current position of ``file``.
+
+    Only the first ``end`` bytes of ``file`` are looked at. Returns a Member, or
+    None if there are no more local headers, i.e. the central directory has
+    been reached. Raises IncompleteMember or UnsupportedMember if the file
+    cannot be read (yet).
+    """
+    start = file.tell()
+    if end - start < len(LOCAL_HEADER_SIGNATURE):
+        raise IncompleteMember()
+    header = file.read(min(LOCAL_HEADER.size, end - start))
+    if header[:len(LOCAL_HEADER_SIGNATURE)] != LOCAL_HEADER_SIGNATURE:
+        return None
+    if len(header) < LOCAL_HEADER.size:
+        raise IncompleteMember()
+    (signature, version, flags, method, mtime, mdate, crc, compressed_size, size,
+     filename_length, extra_length) = LOCAL_HEADER.unpack(header)
+    data_start = start + LOCAL_HEADER.size + filename_length + extra_length
+    if data_start > end:
+        raise IncompleteMember()
+    filename = file.read(filename_length).decode('utf-8' if flags & FLAG_UTF8 else 'cp437')
+    extra = file.read(extra_length)
+
+    if flags & FLAG_ENCRYPTED or method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+        raise UnsupportedMember()
+    descriptor = flags & FLAG_DATA_DESCRIPTOR
+    if descriptor and method == zipfile.ZIP_STORED:
+        # There is no way to tell where the data ends.
+        raise UnsupportedMember()
+    if 0xFFFFFFFF in (compressed_size, size) or (descriptor and has_zip64_extra(extra)):
+        # Zip64; the sizes are elsewhere, and larger.
+        raise UnsupportedMember()
+    if not descriptor and data_start + compressed_size > end:
+        raise IncompleteMember()
+
+    output = SpooledTemporaryFile(max_size=max_memory)
+    try:
+        try:
+            crc, size, actual_crc, actual_size = _decompress(file, end, method, descriptor,
+                                                              crc, compressed_size, size, output)
+        except zlib.error:
+            if descriptor:
+                # Without a valid deflate stream, there is no telling where the data ends.
+                raise UnsupportedMember()
+            file.seek(data_start + compressed_size)
+            actual_crc = actual_size = None
+    except Exception:
+        output.close()
+        raise
+
+    if actual_crc != crc or actual_size != size:
+        output.close()
+        output = None
+    else:
+        output.seek(0)
+    return Member(filename, actual_size, output, file.tell())
+
+
+def _decompress(file, end, method, descriptor, crc, compressed_size, size, output):
+    """Copy the data of a file to output; return its expected and actual CRC and size."""
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS) if method == zipfile.ZIP_DEFLATED else None
+    actual_crc = 0
+    actual_size = 0
+    remaining = None if descriptor else compressed_size
+    while True:
+        if remaining is not None:
+            if not remaining:
+                break
+            block = file.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                raise IncompleteMember()
+            remaining -= len(block)
+        else:
+            if decompressor.unused_data:
+                break
+            block = file.read(min(BLOCK_SIZE, end - file.tell()))
+            if not block:
+                raise IncompleteMember()
+        if decompressor is not None:
+            block = decompressor.decompress(block)
+        actual_crc = zlib.crc32(block, actual_crc)
+        actual_size += len(block)
+        output.write(block)
+    if decompressor is not None:
+        block = decompressor.flush()
+        actual_crc = zlib.crc32(block, actual_crc)
+        actual_size += len(block)
+        output.write(block)
+
+    if descriptor:
+        # The deflate stream ended within the data that was read last.
+        file.seek(file.tell() - len(decompressor.unused_data))
+        if end - file.tell() < len(DATA_DESCRIPTOR_SIGNATURE) + DATA_DESCRIPTOR.size:
+            raise IncompleteMember()
+        if file.read(len(DATA_DESCRIPTOR_SIGNATURE)) != DATA_DESCRIPTOR_SIGNATURE:
+            # The signature is optional.
+            file.seek(file.tell() - len(DATA_DESCRIPTOR_SIGNATURE))
+        crc, compressed_size, size = DATA_DESCRIPTOR.unpack(file.read(DATA_DESCRIPTOR.size))
+    return crc, size, actual_crc & 0xFFFFFFFF, actual_size
+
+
+def has_zip64_extra(extra):
+    """Return True if the extra field of a local header has Zip64 information."""
+    position = 0
+    while position + 4 <= len(extra):
+        header_id, length = struct.unpack('<HH', extra[position:position + 4])
+        if header_id == 0x0001:
+            return True
+        position += 4 + length
+    return False
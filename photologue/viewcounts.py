@@ -0,0 +1,92 @@
+"""
+Counting the views of photos.
+
+A photo size with ``increment_count`` set adds one to the view count of a photo
+each time its url is asked for. Rather than writing each view to the database
+straight away, the views can be buffered in memory and written every
+``PHOTOLOGUE_VIEW_COUNT_FLUSH_INTERVAL`` seconds, with one UPDATE for all the
+photos that got the same number of views.
+
+Buffered views are written when a request finishes once the interval is up, and
+when the process exits; call ``flush_view_counts()`` to write them at any other
+time, e.g. at the end of a management command.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db.models import F
+
+logger = logging.getLogger('photologue.viewcounts')
+
+FLUSH_INTERVAL = getattr(settings, 'PHOTOLOGUE_VIEW_COUNT_FLUSH_INTERVAL', 0)
+
+
+class ViewCountBuffer(object):
+
+    """The views counted in this process that have not been written yet.
+
+    Shared by all instances (Borg pattern).
+    """
+
+    __state = {'counts': {}, 'flushed': time.time(), 'lock': threading.Lock()}
+
+    def __init__(self):
+        self.__dict__ = self.__state
+
+    def add(self, instance, views=1):
+        key = (instance._meta.concrete_model, instance._get_pk_val())
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + views
+        if self.is_due():
+            self.flush()
+
+    def is_due(self):
+        return bool(self.counts) and time.time() - self.flushed >= FLUSH_INTERVAL
+
+    def flush(self):
+        with self.lock:
+            counts, self.counts = self.counts, {}
+            self.flushed = time.time()
+        # One update for all the objects of a model with the same number of views.
+        groups = {}
+        for (model, pk), views in counts.items():
+            groups.setdefault((model, views), []).append(pk)
+        groups = list(groups.items())
+        while groups:
+            (model, views), pks = groups[0]
+            try:
+                model._default_manager.filter(pk__in=pks).update(view_count=F('view_count') + views)
+            except Exception:
+                # Keep the views that were not written for the next flush.
+                with self.lock:
+                    for (model, views), pks in groups:
+                        for pk in pks:
+                            key = (model, pk)
+                            self.counts[key] = self.counts.get(key, 0) + views
+                raise
+            groups.pop(0)
+
+
+def flush_view_counts():
+    """Write the buffered views to the database."""
+    ViewCountBuffer().flush()
+
+
+def flush_if_due(**kwargs):
+    buffer = ViewCountBuffer()
+    if buffer.is_due():
+        buffer.flush()
+request_finished.connect(flush_if_due)
+
+
+@atexit.register
+def flush_at_exit():
+    if ViewCountBuffer().counts:
+        try:
+            flush_view_counts()
+        except Exception:
+            logger.exception('Could not write the view counts of photos.')
@@ -1,10 +1,20 @@
+import json
+import shutil
+import zipfile
 import warnings
+from tempfile import SpooledTemporaryFile
 
+from django import forms
 from django.conf import settings
+from django.contrib.sites.models import Site
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.encoding import force_text
+from django.views.generic.base import View
 from django.views.generic.dates import ArchiveIndexView, DateDetailView, DayArchiveView, MonthArchiveView, YearArchiveView
 from django.views.generic.detail import DetailView
 from django.views.generic.list import ListView
-from .models import Photo, Gallery
+from .models import Photo, Gallery, GalleryUpload, UploadSession
 
 # Number of galleries to display per page.
 GALLERY_PAGINATE_BY = getattr(settings, 'PHOTOLOGUE_GALLERY_PAGINATE_BY', 20)
@@ -24,7 +34,7 @@ if PHOTO_PAGINATE_BY != 20:
 
 
 class GalleryListView(ListView):
-    queryset = Gallery.objects.on_site().is_public()
+    queryset = Gallery.objects.on_site().is_public().with_samples(size='thumbnail')
     paginate_by = GALLERY_PAGINATE_BY
 
     def get_context_data(self, **kwargs):
@@ -41,13 +51,13 @@ class GalleryDetailView(DetailView):
 
 
 class GalleryDateView(object):
-    queryset = Gallery.objects.on_site().is_public()
+    queryset = Gallery.objects.on_site().is_public().with_samples(size='thumbnail')
     date_field = 'date_added'
     allow_empty = True
 
 
 class GalleryDateDetailView(GalleryDateView, DateDetailView):
-    pass
+    queryset = Gallery.objects.on_site().is_public()
 
 
 class GalleryArchiveIndexView(GalleryDateView, ArchiveIndexView):
@@ -161,3 +171,109 @@ class PhotoMonthArchiveView(PhotoDateView, MonthArchiveView):
 
 class PhotoYearArchiveView(PhotoDateView, YearArchiveView):
     make_object_list = True
+
+
+# Chunked upload views.
+
+
+class UploadSessionForm(forms.ModelForm):
+    size = forms.IntegerField(required=False,
+                              min_value=0)
+
+    class Meta:
+        model = GalleryUpload
+        exclude = ['zip_file']
+
+
+def json_response(data, status=200):
+    return HttpResponse(json.dumps(data), content_type='application/json', status=status)
+
+
+class UploadView(View):
+
+    """Upload a gallery zip archive in chunks, for archives too large to go through
+    a single request.
+
+    - POST to ``upload/`` with the same fields as a gallery upload (plus, optionally,
+      ``size``: the size of the archive in bytes) starts an upload.
+    - POST each chunk of the archive, as the raw request body, to
+      ``upload/<id>/<offset>/``. Chunks must be sent in order.
+    - POST to ``upload/<id>/complete/`` once all the chunks have been sent; the
+      photos in the archive are created then.
+
+    ``upload/<id>/`` returns the state of the upload; after a dropped connection,
+    carry on sending from its ``received`` offset. All the views answer with JSON,
+    and need the permission to add gallery uploads.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.has_perm('photologue.add_galleryupload'):
+            return json_response({'error': 'Permission denied.'}, status=403)
+        return super(UploadView, self).dispatch(request, *args, **kwargs)
+
+    def render_session(self, session, status=200):
+        return json_response({'id': session.pk,
+                              'size': session.size,
+                              'received': session.received,
+                              'photo_count': session.photo_count,
+                              'completed': session.completed is not None},
+                             status=status)
+
+
+class UploadStartView(UploadView):
+
+    def post(self, request):
+        form = UploadSessionForm(request.POST)
+        if not form.is_valid():
+            errors = dict((name, [force_text(error) for error in field_errors])
+                          for name, field_errors in form.errors.items())
+            return json_response({'errors': errors}, status=400)
+        upload = form.save(commit=False)
+        gallery = upload.get_gallery(Site.objects.get(id=settings.SITE_ID))
+        session = UploadSession.objects.create(gallery=gallery,
+                                               title=upload.title or gallery.title,
+                                               caption=upload.caption,
+                                               is_public=upload.is_public,
+                                               tags=upload.tags,
+                                               size=form.cleaned_data['size'])
+        return self.render_session(session, status=201)
+
+
+class UploadSessionView(UploadView):
+
+    def get(self, request, pk):
+        return self.render_session(get_object_or_404(UploadSession, pk=pk))
+
+
+class UploadChunkView(UploadView):
+
+    def post(self, request, pk, offset):
+        session = get_object_or_404(UploadSession, pk=pk)
+        if session.completed:
+            return json_response({'error': 'This upload is already complete.'}, status=400)
+        file = SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        try:
+            shutil.copyfileobj(request, file)
+            if not session.add_chunk(int(offset), file):
+                # The client should carry on from the received offset.
+                return self.render_session(session, status=409)
+        finally:
+            file.close()
+        return self.render_session(session)
+
+    put = post
+
+
+class UploadCompleteView(UploadView):
+
+    def post(self, request, pk):
+        session = get_object_or_404(UploadSession, pk=pk)
+        if session.size is not None and session.received < session.size:
+            return self.render_session(session, status=409)
+        try:
+            if not session.complete():
+                # Another request is busy with this upload; try again later.
+                return self.render_session(session, status=202)
+        except zipfile.BadZipfile:
+            return json_response({'error': 'The archive is not a valid zip file.'}, status=400)
+        return self.render_session(session)